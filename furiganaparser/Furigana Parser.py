@@ -2,11 +2,19 @@ import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter import filedialog, messagebox
 import threading
+import queue
+import logging
+import sqlite3
 import sys
 import subprocess
 import os
 import JMRParser
 
+# Worker threads never touch widgets: they post events that the Tk main
+# thread drains at most once per UI_REFRESH_MS, so a per-line progress
+# callback costs a queue put rather than a redraw.
+UI_REFRESH_MS = 33
+
 skipped_line_message = [None]
 def ui_warning_callback(msg):
     if skipped_line_message[0] is None:
@@ -59,25 +67,79 @@ class FuriganaApp(tk.Tk):
         self.manual_file = os.path.join(script_dir, "Translation Sheet.xlsx")
         self.output_basename = "Output"
 
+        # Reuse furigana for lines converted in earlier runs
+        # (optional: a read-only install folder just runs without it)
+        try:
+            JMRParser.enable_ruby_cache(os.path.join(script_dir, "furigana_cache.sqlite3"))
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Furigana cache disabled: {e}")
+        try:
+            JMRParser.enable_translation_memory(os.path.join(script_dir, "translation_memory.sqlite3"))
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Translation memory disabled: {e}")
+
         self.use_offline = tk.BooleanVar(value=True)
         self.use_online = tk.BooleanVar(value=False)
         self.use_spreadsheet = tk.BooleanVar(value=False)
 
+        self.ui_events = queue.Queue()
+
         # Create the status label early with “Loading...” text
 
         threading.Thread(target=self.background_init, daemon=True).start()
 
         self.create_widgets()
+        self.after(UI_REFRESH_MS, self.drain_ui_events)
 
     def background_init(self):
-        # Run the heavy initialization function
-        JMRParser.heavy_initialization()
+        # Run the heavy initialization function; the model itself loads in
+        # the background so the first processed line isn't slow
+        JMRParser.heavy_initialization(warm_up=True)
         
-        # After it finishes, schedule a function on the main thread to update the UI
-        self.after(0, self.set_ready_status)
+        # After it finishes, let the main thread update the UI
+        self.post_status(text="Ready", fg="blue")
+
+    # Events from worker threads: ("progress", (current, total)),
+    # ("status", label options), ("warning", text), ("percent", value)
+    def post_progress(self, current, total):
+        self.ui_events.put(("progress", (current, total)))
+
+    def post_status(self, **options):
+        self.ui_events.put(("status", options))
 
-    def set_ready_status(self):
-        self.status_label.config(text="Ready", fg="blue")
+    def post_warning(self, text):
+        self.ui_events.put(("warning", text))
+
+    def post_percent(self, value):
+        self.ui_events.put(("percent", value))
+
+    def drain_ui_events(self):
+        # Only the latest progress before each other event is drawn
+        progress = None
+        while True:
+            try:
+                kind, payload = self.ui_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                progress = payload
+                continue
+            if progress:
+                self.show_progress(*progress)
+                progress = None
+            if kind == "status":
+                self.status_label.config(**payload)
+            elif kind == "warning":
+                self.warning_label.config(text=payload)
+            elif kind == "percent":
+                self.progress_var.set(payload)
+        if progress:
+            self.show_progress(*progress)
+        self.after(UI_REFRESH_MS, self.drain_ui_events)
+
+    def show_progress(self, current, total):
+        self.progress_var.set((current + 1) / total * 100)
+        self.status_label.config(text=f"Processing line {current + 1} of {total}")
 
     def create_widgets(self):
         # Input file
@@ -154,10 +216,6 @@ class FuriganaApp(tk.Tk):
         self.warning_label = tk.Label(self, text="", fg="red")
         self.warning_label.pack(pady=2)
 
-    def update_progress(self, current, total):
-        self.status_label.config(text=f"Processing line {current + 1} of {total}")
-        self.update_idletasks()
-
     def browse_input(self):
         file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
         if file_path:
@@ -224,12 +282,6 @@ class FuriganaApp(tk.Tk):
 
             output_json_path = os.path.join(output_folder, base_name + ".json")
 
-            def progress_callback(current, total):
-                percent = (current + 1) / total * 100
-                self.progress_var.set(percent)
-                self.status_label.config(text=f"Processing line {current + 1} of {total}")
-                self.update_idletasks()
-
             JMRParser.process_lines_with_options(
                 input_path=input_path,
                 output_path=output_json_path,
@@ -237,22 +289,22 @@ class FuriganaApp(tk.Tk):
                 use_offline=use_offline,
                 use_online=use_online,
                 export_spreadsheet=export_spreadsheet,
-                progress_callback=progress_callback,
+                progress_callback=self.post_progress,
                 ui_warning_callback=ui_warning_callback
             )
 
             warning_text = skipped_line_message[0] if skipped_line_message[0] else ""
 
             if export_spreadsheet:
-                self.status_label.config(text=f"Done! JSON and spreadsheet exported.", fg="blue")
+                self.post_status(text=f"Done! JSON and spreadsheet exported.", fg="blue")
             else:
-                self.status_label.config(text=f"Done! JSON exported.", fg="blue")
-            self.warning_label.config(text=warning_text)
-            self.progress_var.set(100)
+                self.post_status(text=f"Done! JSON exported.", fg="blue")
+            self.post_warning(warning_text)
+            self.post_percent(100)
         except Exception as e:
-            self.status_label.config(text=f"Error: {e}", fg="red")
-            self.progress_var.set(0)
-            self.warning_label.config(text="")
+            self.post_status(text=f"Error: {e}", fg="red")
+            self.post_percent(0)
+            self.post_warning("")
 
     def process_task_word(self):
         try:
@@ -261,13 +313,13 @@ class FuriganaApp(tk.Tk):
             base_name = self.output_basename_entry.get()
 
             output_docx_path = os.path.join(output_folder, base_name + ".docx")
-            JMRParser.create_docx_with_eq_fields(input_path, output_docx_path)
+            JMRParser.create_docx_with_eq_fields(input_path, output_docx_path, backend="stream")
 
-            self.status_label.config(text="Done! Word document exported.", fg="blue")
-            self.progress_var.set(100)
+            self.post_status(text="Done! Word document exported.", fg="blue")
+            self.post_percent(100)
         except Exception as e:
-            self.status_label.config(text=f"Error: {e}", fg="red")
-            self.progress_var.set(0)
+            self.post_status(text=f"Error: {e}", fg="red")
+            self.post_percent(0)
 
 if __name__ == "__main__":
     def ensure_required_packages():
@@ -1,41 +1,40 @@
-import requests
-import tempfile
 import re
 import os
-import time
 import threading
-import time
+import sqlite3
+import queue
 import sys
 from pathlib import Path
 
-TRACK_NO_RE = re.compile(r'^\s*(\d{1,3})\s*[\.．]?\s*')
-
-def parse_track_no(title: str) -> int | None:
-    m = TRACK_NO_RE.match(title or "")
-    return int(m.group(1)) if m else None
-
-def strip_track_prefix(title: str) -> str:
-    return TRACK_NO_RE.sub("", title or "").strip()
-
 REPO_ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(REPO_ROOT))
 
-from shared.JMRParser import create_docx_with_eq_fields, generate_obsidian_lyric_file
-
-from bs4 import BeautifulSoup
+from lyricsretriever.utanet import (
+    HTTP_CACHE_FILENAME,
+    create_docx_from_lyrics,
+    disable_http_cache,
+    enable_http_cache,
+    export_album_to_docx,
+    export_album_to_obsidian,
+    fetch_artist_album_page,
+    fetch_lyrics_many,
+    get_albums_and_tracks,
+    http_stats,
+    load_sync_state,
+    sanitize_filename,
+    save_sync_state,
+    search_artist,
+    search_songs,
+    sync_state_path,
+)
+from shared.JMRParser import enable_ruby_cache, obsidian_export_stats
 
 import tkinter as tk
 from tkinter import ttk, filedialog
 
-BASE_URL = "https://www.uta-net.com"
-REQUEST_DELAY = 1.0
-
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
-    "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
-    "Referer": "https://www.uta-net.com/",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-}
+# Worker threads queue result-list updates; the Tk main thread applies
+# them in batches, at most once per UI_REFRESH_MS.
+UI_REFRESH_MS = 33
 
 def set_buttons_state(self, state="normal"):
     for child in self.winfo_children():
@@ -43,119 +42,6 @@ def set_buttons_state(self, state="normal"):
             if isinstance(btn, ttk.Button):
                 btn.config(state=state)
 
-def create_docx_from_lyrics(lyrics_text, output_path):
-    with tempfile.NamedTemporaryFile("w+", encoding="utf-8", delete=False, suffix=".txt") as tmp:
-        tmp.write(lyrics_text)
-        tmp.flush()
-        create_docx_with_eq_fields(tmp.name, output_path)
-
-def sanitize_filename(text):
-    return re.sub(r'[\\/:\*\?"<>|]', '_', text)
-
-def fetch_lyrics(song_url):
-    time.sleep(REQUEST_DELAY)
-    res = requests.get(song_url, headers=headers)
-    res.encoding = 'utf-8'
-    soup = BeautifulSoup(res.text, 'html.parser')
-    div = soup.find('div', itemprop='lyrics')
-    if not div:
-        return ""
-    for br in div.find_all("br"):
-        br.replace_with("\n")
-    text = div.get_text().strip()
-
-    # Remove promotional lines
-    lines = text.splitlines()
-    cleaned = []
-    for line in lines:
-        if line.startswith("この歌詞をマイ歌ネットに登録") or line.startswith("このアーティストをマイ歌ネットに登録"):
-            continue
-        cleaned.append(line)
-    return "\n".join(cleaned)
-
-def search_artist(japanese_name):
-    url = f"{BASE_URL}/search/?Aselect=1&Bselect=1&Keyword={requests.utils.quote(japanese_name)}"
-    res = requests.get(url, headers=headers)
-    res.encoding = 'utf-8'
-    soup = BeautifulSoup(res.text, 'html.parser')
-    results = []
-    for row in soup.select("tbody.songlist-table-body tr.border-bottom"):
-        a_tag = row.select_one("a.d-block")
-        if not a_tag:
-            continue
-        href = a_tag.get("href")
-        match = re.search(r"/artist/(\d+)/", href)
-        if not match:
-            continue
-        artist_id = match.group(1)
-        artist_name_tag = a_tag.select_one("span.fw-bold")
-        artist_name = artist_name_tag.text.strip() if artist_name_tag else a_tag.text.strip()
-        results.append((artist_id, artist_name))
-        if len(results) >= 5:
-            break
-    return results
-
-def fetch_artist_album_page(artist_id):
-    url = f"{BASE_URL}/user/search_index/artist.html?AID={artist_id}"
-    res = requests.get(url, headers=headers)
-    res.encoding = 'utf-8'
-    return BeautifulSoup(res.text, 'html.parser')
-
-def get_albums_and_tracks(soup):
-    albums = []
-    tables = soup.find_all("table", class_="album_table")
-    print(f"Found {len(tables)} album tables")
-    for tbl in tables:
-        title_elem = tbl.select_one("div.album_title a")
-        if not title_elem:
-            continue
-        album_title = title_elem.text.strip()
-
-        release_date = get_release_date(tbl)
-
-        track_links = []
-        for li in tbl.select("li a"):
-            href = li.get("href")
-            track_links.append((li.text.strip(), BASE_URL + href))
-        albums.append((album_title, release_date, track_links))
-        albums.sort(key=lambda x: (x[1] or "9999"))
-    return albums
-
-def get_release_date(album_table):
-    dl = album_table.find("dl", class_="clearfix")
-    if not dl:
-        return None
-    dt_tags = dl.find_all("dt")
-    for dt in dt_tags:
-        if dt.text.strip() == "発売日：":
-            dd = dt.find_next_sibling("dd")
-            if dd:
-                return dd.text.strip().split("/")[0]
-    return None
-
-def search_songs(song_title):
-    url = f"{BASE_URL}/search/?Aselect=2&Bselect=3&Keyword={requests.utils.quote(song_title)}"
-    res = requests.get(url, headers=headers)
-    res.encoding = 'utf-8'
-    soup = BeautifulSoup(res.text, 'html.parser')
-    results = []
-    for row in soup.select("tbody.songlist-table-body tr.border-bottom"):
-        a_tag = row.select_one("td.sp-w-100 a")  # selects the <a> inside the first td cell
-        if not a_tag:
-            continue
-        href = a_tag.get("href")
-        full_url = BASE_URL + href
-        title_span = a_tag.select_one("span.songlist-title")
-        title = title_span.text.strip() if title_span else a_tag.text.strip()
-        tds = row.find_all("td")
-        artist_name = tds[1].text.strip() if len(tds) > 1 else "Unknown"
-        results.append((title, artist_name, full_url))
-        if len(results) >= 10:
-            break
-    # print(str(soup.select_one("tbody.songlist-table-body tr.border-bottom")))
-    # print(f"Title: {title}, Artist: {artist_name}, URL: {full_url}")
-    return results
-
 class UtaNetScraperApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -165,6 +51,15 @@ class UtaNetScraperApp(tk.Tk):
         self.save_path = tk.StringVar(value=os.path.abspath("lyrics"))
         self.save_path = tk.StringVar(value="C:/Sync")
 
+        # Reuse furigana for lines converted in earlier runs (choruses, compilations)
+        try:
+            enable_ruby_cache()
+        except (OSError, sqlite3.Error) as e:
+            print(f"[⚠️] Furigana cache disabled: {e}")
+
+        # Fetched pages are cached in the save folder (see update_http_cache)
+        self.http_cache_folder = None
+
         # UI setup (same as before)...
         search_frame = ttk.LabelFrame(self, text="Search")
         search_frame.pack(fill="x", padx=10, pady=10)
@@ -203,6 +98,9 @@ class UtaNetScraperApp(tk.Tk):
         self.clear_button = ttk.Button(actions_frame, text="Clear Results", command=self.clear_results)
         self.clear_button.pack(side="left", padx=5)
 
+        self.only_new_songs = tk.BooleanVar(value=True)
+        ttk.Checkbutton(actions_frame, text="Only new songs", variable=self.only_new_songs).pack(side="left", padx=5)
+
         # Internal state
         self.current_mode = None  # "artist" or "song"
         self.current_artist_data = []  # Can be list of artist candidates or albums
@@ -210,7 +108,23 @@ class UtaNetScraperApp(tk.Tk):
 
         # Save artist name for album downloads
         self.current_artist_name = None
+
+        self.ui_events = queue.Queue()
+        self.after(UI_REFRESH_MS, self.drain_ui_events)
     
+    def update_http_cache(self):
+        # Called as each action starts, so the cache follows the save folder
+        folder = self.save_path.get()
+        if folder == self.http_cache_folder:
+            return
+        self.http_cache_folder = folder
+        try:
+            os.makedirs(folder, exist_ok=True)
+            enable_http_cache(os.path.join(folder, HTTP_CACHE_FILENAME))
+        except (OSError, sqlite3.Error) as e:
+            print(f"[⚠️] HTTP cache disabled: {e}")
+            disable_http_cache()
+
     def browse_folder(self):
         folder = filedialog.askdirectory()
         if folder:
@@ -223,6 +137,7 @@ class UtaNetScraperApp(tk.Tk):
             self.create_docx_button.config(state='disabled')
             self.fetch_lyrics_button.config(state='disabled')
             try:
+                self.update_http_cache()
                 self.create_docx_action()
             finally:
                 self.clear_button.config(state='normal')
@@ -236,6 +151,7 @@ class UtaNetScraperApp(tk.Tk):
             self.create_docx_button.config(state='disabled')
             self.fetch_lyrics_button.config(state='disabled')
             try:
+                self.update_http_cache()
                 self.search_artist_action()
             finally:
                 self.clear_button.config(state='normal')
@@ -248,6 +164,7 @@ class UtaNetScraperApp(tk.Tk):
             self.create_docx_button.config(state='disabled')
             self.fetch_lyrics_button.config(state='disabled')
             try:
+                self.update_http_cache()
                 self.search_song_action()
             finally:
                 self.clear_button.config(state='normal')
@@ -261,6 +178,7 @@ class UtaNetScraperApp(tk.Tk):
             self.create_docx_button.config(state='disabled')
             self.fetch_lyrics_button.config(state='disabled')
             try:
+                self.update_http_cache()
                 self.fetch_lyrics_action()
             finally:
                 self.clear_button.config(state='normal')
@@ -386,19 +304,32 @@ class UtaNetScraperApp(tk.Tk):
                 self.safe_insert_results("error", "Error", "Select at least one album.")
                 return
 
+            written, skipped = obsidian_export_stats["written"], obsidian_export_stats["skipped"]
+            # Only new songs: skip songs already recorded in the artist's sync state
+            state_path = sync_state_path(self.save_path.get(), self.current_artist_name)
+            sync_state = load_sync_state(state_path) if self.only_new_songs.get() else None
+            added = 0
             for album_title, release_date, tracks in selected_albums:
-                self.save_album_lyrics(artist_name=self.current_artist_name,
+                added += self.save_album_lyrics(artist_name=self.current_artist_name,
                                        album=album_title,
                                        tracks=tracks,
-                                       save_folder=save_folder)
+                                       save_folder=save_folder,
+                                       sync_state=sync_state)
+            if sync_state is not None:
+                save_sync_state(state_path, sync_state)
+                self.safe_insert_results(f"➕ {added} new song(s) added")
+            self.safe_insert_results(
+                f"✔️ Obsidian vault: {obsidian_export_stats['written'] - written} written, "
+                f"{obsidian_export_stats['skipped'] - skipped} unchanged"
+            )
 
         elif self.current_mode == "song":
             selected_songs = [self.current_song_data[i] for i in selections if i < len(self.current_song_data)]
             if not selected_songs:
                 self.safe_insert_results("error", "Error", "Select at least one song.")
                 return
-            for title, artist, url in selected_songs:
-                lyrics = fetch_lyrics(url)
+            song_lyrics = fetch_lyrics_many(url for _, _, url in selected_songs)
+            for (title, artist, url), lyrics in zip(selected_songs, song_lyrics):
                 if not lyrics:
                     self.safe_insert_results("warning", "Warning", f"Missing lyrics for {title}")
                     continue
@@ -409,34 +340,21 @@ class UtaNetScraperApp(tk.Tk):
                 print(f"Saved: {filepath}")
             self.safe_insert_results("info", "Done", "Lyrics saved for selected songs.")
 
-    def save_album_lyrics(self, artist_name, album, tracks, save_folder):
-        # Use the largest number we can parse from any title as total_tracks
-        nums = [n for (t, _) in tracks if (n := parse_track_no(t))]
-        total_tracks = max(nums) if nums else len(tracks)
+    def save_album_lyrics(self, artist_name, album, tracks, save_folder, sync_state=None):
+        requests_before, connections_before = http_stats["requests"], http_stats["connections"]
 
-        for i, (title, url) in enumerate(tracks, start=1):
-            time.sleep(REQUEST_DELAY)
-            lyrics = fetch_lyrics(url)
-            if not lyrics:
-                print(f"[⚠️] Missing lyrics for {title}")
-                continue
-
-            track_num = parse_track_no(title) or i   # ← use the title’s number
-            lyrics_lines = lyrics.strip().splitlines()
-
-            generate_obsidian_lyric_file(
-                lyrics_lines=lyrics_lines,
-                song_title=strip_track_prefix(title),  # pretty title (no leading digits)
-                artist=artist_name,
-                album=album,
-                track_number=track_num,                # ← now from the title
-                total_tracks=total_tracks,             # ← from parsed max
-                track_titles=[t for t, _ in tracks],
-                output_root=self.save_path.get()
-            )
+        added = export_album_to_obsidian(
+            artist_name, album, tracks, self.save_path.get(), sync_state=sync_state
+        )
+        for title in added:
             self.safe_insert_results(f"✔️ Exported Obsidian MD: {title}")
 
-            print(f"✔️ Saved all lyrics to vault")
+        print(f"✔️ Saved all lyrics to vault")
+        print(
+            f"HTTP: {http_stats['requests'] - requests_before} requests over "
+            f"{http_stats['connections'] - connections_before} new connection(s)"
+        )
+        return len(added)
 
     def create_docx_action(self):
         selections = self.results_list.curselection()
@@ -452,8 +370,8 @@ class UtaNetScraperApp(tk.Tk):
                 self.safe_insert_results("⚠️ No songs selected.")
                 return
 
-            for title, artist, url in selected_songs:
-                lyrics = fetch_lyrics(url)
+            song_lyrics = fetch_lyrics_many(url for _, _, url in selected_songs)
+            for (title, artist, url), lyrics in zip(selected_songs, song_lyrics):
                 if not lyrics:
                     self.safe_insert_results(f"[⚠️] Missing lyrics for: {title}")
                     continue
@@ -473,31 +391,15 @@ class UtaNetScraperApp(tk.Tk):
             return
 
         for album_title, release_date, tracks in [self.current_artist_data[i] for i in selections]:
-            artist_dir = os.path.join(save_folder, sanitize_filename(self.current_artist_name))
-            os.makedirs(artist_dir, exist_ok=True)
-            album_docx_path = os.path.join(artist_dir, sanitize_filename(album_title) + ".docx")
-
-            all_lyrics = []
-            for title, url in tracks:
-                lyrics = fetch_lyrics(url)
-                if not lyrics:
-                    print(f"[⚠️] Missing lyrics for {title}")
-                    continue
-                clean_title = re.sub(r"^(\d+)\s+", r"\1. ", title)
-                song_text = f"{clean_title}\n\n{lyrics}\n\n{'='*40}\n\n"
-                all_lyrics.append(song_text)
+            album_docx_path, fetched = export_album_to_docx(
+                self.current_artist_name, album_title, tracks, save_folder
+            )
+            for title in fetched:
                 self.safe_insert_results(f"✔️ Fetched lyrics for: {title}")
-
-            lyrics_text = "".join(all_lyrics)
-            delimiter = "\n\n" + "=" * 40 + "\n\n"
-            lyrics_text = "".join(all_lyrics)
-            if lyrics_text.endswith(delimiter):
-                lyrics_text = lyrics_text[:lyrics_text.rfind(delimiter)]
-            if not lyrics_text.strip():
+            if album_docx_path is None:
                 self.safe_insert_results("warning", "No Lyrics", f"No lyrics found for album '{album_title}'.")
                 continue
 
-            create_docx_from_lyrics(lyrics_text, album_docx_path)
             self.safe_insert_results(f"✔️ Created DOCX: {album_docx_path}")
 
     def clear_results(self):
@@ -512,10 +414,29 @@ class UtaNetScraperApp(tk.Tk):
 
     # Thread-safe UI helpers
     def safe_insert_results(self, text):
-        self.after(0, lambda: self.results_list.insert(tk.END, text))
+        self.ui_events.put(("insert", text))
 
     def safe_clear_results(self):
-        self.after(0, self.results_list.delete, 0, tk.END)
+        self.ui_events.put(("clear", None))
+
+    def drain_ui_events(self):
+        # Consecutive inserts go to the listbox in a single call
+        pending = []
+        while True:
+            try:
+                kind, text = self.ui_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "insert":
+                pending.append(text)
+                continue
+            if pending:
+                self.results_list.insert(tk.END, *pending)
+                pending = []
+            self.results_list.delete(0, tk.END)
+        if pending:
+            self.results_list.insert(tk.END, *pending)
+        self.after(UI_REFRESH_MS, self.drain_ui_events)
 
 if __name__ == "__main__":
     app = UtaNetScraperApp()
@@ -0,0 +1,71 @@
+"""Check the strained uta-net extractors against a full-page parse.
+
+    python lyricsretriever/check_parsing.py [runs]
+
+Each saved page in fixtures/ is extracted twice: by utanet's extractors
+(SoupStrainer subtree, lxml when installed) and by the same extraction code
+on a full html.parser document, which is how the pages were parsed before
+straining. Results must be identical; the time per page is printed for
+both. Exits with status 1 on any difference.
+"""
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from bs4 import BeautifulSoup
+
+from lyricsretriever import utanet
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def extract_albums(html):
+    return utanet.get_albums_and_tracks(utanet.parse_html(html, utanet.ALBUM_TABLE_STRAINER))
+
+# fixture file -> extractor for that page type
+PAGES = (
+    ("song.html", utanet.extract_lyrics),
+    ("search_artist.html", utanet.extract_artist_results),
+    ("search_song.html", utanet.extract_song_results),
+    ("artist_albums.html", extract_albums),
+)
+
+def full_page_parse(html, parse_only=None):
+    return BeautifulSoup(html, "html.parser")
+
+def timed(extract, html, runs):
+    started = time.perf_counter()
+    for _ in range(runs):
+        result = extract(html)
+    return result, (time.perf_counter() - started) / runs * 1000
+
+def main(runs=10):
+    strained_parse = utanet.parse_html
+    failed = 0
+    # get_albums_and_tracks prints its table count
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        results = []
+        for filename, extract in PAGES:
+            with open(os.path.join(FIXTURES_DIR, filename), encoding="utf-8") as f:
+                html = f.read()
+            strained, strained_ms = timed(extract, html, runs)
+            utanet.parse_html = full_page_parse
+            try:
+                full, full_ms = timed(extract, html, runs)
+            finally:
+                utanet.parse_html = strained_parse
+            results.append((filename, strained == full, bool(full), full_ms, strained_ms))
+
+    print(f"parser: {utanet.HTML_PARSER}, {runs} runs per page")
+    for filename, same, non_empty, full_ms, strained_ms in results:
+        ok = same and non_empty
+        failed += not ok
+        print(f"{'ok  ' if ok else 'DIFF'} {filename:20} full page {full_ms:7.1f} ms   strained {strained_ms:7.1f} ms")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10))
@@ -0,0 +1,524 @@
+# uta-net scraping core: HTTP session, rate limit and page cache, HTML
+# extraction, and Obsidian export with artist sync. No GUI imports, so the
+# Tk app (JPlyricScraper.py) and the batch CLI (utanet_batch.py) share it.
+import io
+import json
+import requests
+import re
+import os
+import time
+import threading
+import sqlite3
+from contextlib import closing
+import sys
+from pathlib import Path
+
+TRACK_NO_RE = re.compile(r'^\s*(\d{1,3})\s*[\.．]?\s*')
+
+def parse_track_no(title: str) -> int | None:
+    m = TRACK_NO_RE.match(title or "")
+    return int(m.group(1)) if m else None
+
+def strip_track_prefix(title: str) -> str:
+    return TRACK_NO_RE.sub("", title or "").strip()
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from shared.JMRParser import create_docx_with_eq_fields, generate_obsidian_album, fs_safe
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+BASE_URL = "https://www.uta-net.com"
+
+# Politeness budget shared by every request: a token bucket refilled at
+# REQUESTS_PER_SECOND (bursts up to RATE_BURST) and at most MAX_IN_FLIGHT
+# requests open at once. Album pages are fetched concurrently within it.
+REQUESTS_PER_SECOND = 1.0
+RATE_BURST = 1
+MAX_IN_FLIGHT = 4
+
+headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36",
+    "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
+    "Referer": "https://www.uta-net.com/",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+# -------- HTTP session ------------------------------------------------------
+# One keep-alive session shared by every thread. urllib3's pool is
+# thread-safe and sized to the in-flight limit; pool_block makes extra
+# threads wait for a free connection instead of opening throwaway ones. Transient errors are retried with
+# exponential backoff (0.5 s, 1 s, 2 s), honouring Retry-After.
+HTTP_TIMEOUT = 20
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+http_stats = {"requests": 0, "connections": 0, "cache_hits": 0, "revalidated": 0}
+
+def _counting_pool(base):
+    class CountingPool(base):
+        def _new_conn(self):
+            with _http_session_lock:
+                http_stats["connections"] += 1
+            return super()._new_conn()
+    return CountingPool
+
+class TokenBucket:
+    """Blocking token bucket: acquire() returns once a request may be sent."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+_rate_limiter = TokenBucket(REQUESTS_PER_SECOND, RATE_BURST)
+_max_in_flight = MAX_IN_FLIGHT
+_in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+def configure_rate_limit(requests_per_second=REQUESTS_PER_SECOND, burst=RATE_BURST,
+                         max_in_flight=MAX_IN_FLIGHT):
+    """Replace the shared politeness budget (call before starting requests)."""
+    global _rate_limiter, _max_in_flight, _in_flight
+    _rate_limiter = TokenBucket(requests_per_second, burst)
+    _max_in_flight = max_in_flight
+    _in_flight = threading.BoundedSemaphore(max_in_flight)
+
+def get_http_session():
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            from requests.adapters import HTTPAdapter
+            from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+            from urllib3.util.retry import Retry
+
+            retry = Retry(
+                total=HTTP_RETRIES,
+                backoff_factor=HTTP_BACKOFF,
+                status_forcelist=HTTP_RETRY_STATUSES,
+                allowed_methods=("GET", "HEAD"),
+                respect_retry_after_header=True,
+                raise_on_status=False,             # hand back the last error page
+            )
+            adapter = HTTPAdapter(pool_maxsize=_max_in_flight, pool_block=True, max_retries=retry)
+            # Count every new TCP connection, so reuse can be checked per run
+            adapter.poolmanager.pool_classes_by_scheme = {
+                "http": _counting_pool(HTTPConnectionPool),
+                "https": _counting_pool(HTTPSConnectionPool),
+            }
+            session = requests.Session()
+            session.headers.update(headers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+def http_get(url, extra_headers=None):
+    """GET url through the shared session within the rate limit; the body is decoded as UTF-8."""
+    session = get_http_session()
+    with _in_flight:
+        _rate_limiter.acquire()
+        res = session.get(url, headers=extra_headers, timeout=HTTP_TIMEOUT)
+    with _http_session_lock:
+        http_stats["requests"] += 1
+    res.encoding = 'utf-8'
+    return res
+
+# -------- HTTP response cache -----------------------------------------------
+# Optional SQLite store of page bodies keyed by URL, kept in the save folder.
+# Fresh entries are served without touching the network; stale ones are
+# revalidated with ETag / Last-Modified when the server sent them. Least
+# recently used pages are evicted past HTTP_CACHE_MAX_BYTES.
+HTTP_CACHE_FILENAME = ".uta-net-cache.sqlite3"
+HTTP_CACHE_MAX_BYTES = 200 * 1024 * 1024
+HTTP_CACHE_DEFAULT_TTL = 60 * 60
+# (URL prefix, seconds): lyrics rarely change, search results often do
+HTTP_CACHE_TTLS = (
+    (f"{BASE_URL}/song/", 30 * 24 * 60 * 60),
+    (f"{BASE_URL}/user/search_index/artist.html", 24 * 60 * 60),
+    (f"{BASE_URL}/search/", 60 * 60),
+)
+
+_http_cache_path = None
+_http_cache_max_bytes = HTTP_CACHE_MAX_BYTES
+
+def enable_http_cache(path, max_bytes=HTTP_CACHE_MAX_BYTES):
+    global _http_cache_path, _http_cache_max_bytes
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, body TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "fetched_at REAL NOT NULL, last_used REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+    _http_cache_path = path
+    _http_cache_max_bytes = max_bytes
+
+def disable_http_cache():
+    global _http_cache_path
+    _http_cache_path = None
+
+def _http_cache_ttl(url):
+    for prefix, ttl in HTTP_CACHE_TTLS:
+        if url.startswith(prefix):
+            return ttl
+    return HTTP_CACHE_DEFAULT_TTL
+
+def _http_cache_get(url):
+    try:
+        with closing(sqlite3.connect(_http_cache_path)) as conn, conn:
+            row = conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+            return row
+    except sqlite3.Error as e:
+        print(f"[⚠️] HTTP cache lookup failed: {e}")
+        return None
+
+def _http_cache_put(url, body, etag, last_modified):
+    now = time.time()
+    try:
+        with closing(sqlite3.connect(_http_cache_path)) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, body, etag, last_modified, fetched_at, last_used, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, now, now, len(body.encode("utf-8")))
+            )
+            # evict least recently used pages beyond the size cap
+            conn.execute(
+                "DELETE FROM responses WHERE url IN (SELECT url FROM ("
+                "SELECT url, SUM(size) OVER (ORDER BY last_used DESC, url) AS running FROM responses"
+                ") WHERE running > ?)",
+                (_http_cache_max_bytes,)
+            )
+    except sqlite3.Error as e:
+        print(f"[⚠️] HTTP cache update failed: {e}")
+
+def _http_cache_touch(url):
+    try:
+        with closing(sqlite3.connect(_http_cache_path)) as conn, conn:
+            now = time.time()
+            conn.execute("UPDATE responses SET fetched_at = ?, last_used = ? WHERE url = ?", (now, now, url))
+    except sqlite3.Error as e:
+        print(f"[⚠️] HTTP cache update failed: {e}")
+
+def get_page_text(url):
+    """Body of url as text, from the response cache when it is fresh enough."""
+    cached = _http_cache_get(url) if _http_cache_path else None
+    conditional = {}
+    if cached:
+        body, etag, last_modified, fetched_at = cached
+        if time.time() - fetched_at < _http_cache_ttl(url):
+            with _http_session_lock:
+                http_stats["cache_hits"] += 1
+            return body
+        if etag:
+            conditional["If-None-Match"] = etag
+        if last_modified:
+            conditional["If-Modified-Since"] = last_modified
+
+    res = http_get(url, conditional or None)
+    if cached and res.status_code == 304:
+        _http_cache_touch(url)
+        with _http_session_lock:
+            http_stats["revalidated"] += 1
+        return body
+    # Error pages left after the retries aren't content: raise, don't parse
+    res.raise_for_status()
+
+    text = res.text
+    if _http_cache_path and res.status_code == 200:
+        _http_cache_put(url, text, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+    return text
+
+def create_docx_from_lyrics(lyrics_text, output_path):
+    create_docx_with_eq_fields(io.StringIO(lyrics_text, newline=None), output_path, backend="stream")
+
+def sanitize_filename(text):
+    return re.sub(r'[\\/:\*\?"<>|]', '_', text)
+
+# -------- HTML extraction -----------------------------------------------------
+# Each page type only needs one subtree, so parsing is restricted to it with
+# a SoupStrainer, using lxml when it is installed.
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# class is matched per token, like class_= and CSS selectors do, so a page
+# that adds classes (class="album_table mb-3") still matches
+LYRICS_STRAINER = SoupStrainer("div", attrs={"itemprop": "lyrics"})
+ALBUM_TABLE_STRAINER = SoupStrainer("table", attrs={"class": re.compile(r"(^|\s)album_table(\s|$)")})
+SONGLIST_STRAINER = SoupStrainer("tbody", attrs={"class": re.compile(r"(^|\s)songlist-table-body(\s|$)")})
+
+def parse_html(html, parse_only=None):
+    return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
+
+def fetch_lyrics(song_url):
+    """Lyrics of a song page; "" if the page has none, None if it couldn't be fetched.
+
+    A page that still fails after the retries only drops its own song.
+    """
+    try:
+        return extract_lyrics(get_page_text(song_url))
+    except requests.RequestException as e:
+        print(f"[⚠️] Fetch failed for {song_url}: {e}")
+        return None
+
+def extract_lyrics(html):
+    soup = parse_html(html, LYRICS_STRAINER)
+    div = soup.find('div', itemprop='lyrics')
+    if not div:
+        return ""
+    for br in div.find_all("br"):
+        br.replace_with("\n")
+    text = div.get_text().strip()
+
+    # Remove promotional lines
+    lines = text.splitlines()
+    cleaned = []
+    for line in lines:
+        if line.startswith("この歌詞をマイ歌ネットに登録") or line.startswith("このアーティストをマイ歌ネットに登録"):
+            continue
+        cleaned.append(line)
+    return "\n".join(cleaned)
+
+def fetch_lyrics_many(song_urls):
+    """fetch_lyrics for every URL, concurrently within the rate limit; results in input order."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    song_urls = list(song_urls)
+    if len(song_urls) <= 1:
+        return [fetch_lyrics(url) for url in song_urls]
+    with ThreadPoolExecutor(max_workers=min(_max_in_flight, len(song_urls))) as pool:
+        return list(pool.map(fetch_lyrics, song_urls))
+
+def search_artist(japanese_name):
+    url = f"{BASE_URL}/search/?Aselect=1&Bselect=1&Keyword={requests.utils.quote(japanese_name)}"
+    return extract_artist_results(get_page_text(url))
+
+def extract_artist_results(html):
+    soup = parse_html(html, SONGLIST_STRAINER)
+    results = []
+    for row in soup.select("tbody.songlist-table-body tr.border-bottom"):
+        a_tag = row.select_one("a.d-block")
+        if not a_tag:
+            continue
+        href = a_tag.get("href")
+        match = re.search(r"/artist/(\d+)/", href)
+        if not match:
+            continue
+        artist_id = match.group(1)
+        artist_name_tag = a_tag.select_one("span.fw-bold")
+        artist_name = artist_name_tag.text.strip() if artist_name_tag else a_tag.text.strip()
+        results.append((artist_id, artist_name))
+        if len(results) >= 5:
+            break
+    return results
+
+def fetch_artist_album_page(artist_id):
+    url = f"{BASE_URL}/user/search_index/artist.html?AID={artist_id}"
+    return parse_html(get_page_text(url), ALBUM_TABLE_STRAINER)
+
+def get_albums_and_tracks(soup):
+    albums = []
+    tables = soup.find_all("table", class_="album_table")
+    print(f"Found {len(tables)} album tables")
+    for tbl in tables:
+        title_elem = tbl.select_one("div.album_title a")
+        if not title_elem:
+            continue
+        album_title = title_elem.text.strip()
+
+        release_date = get_release_date(tbl)
+
+        track_links = []
+        for li in tbl.select("li a"):
+            href = li.get("href")
+            track_links.append((li.text.strip(), BASE_URL + href))
+        albums.append((album_title, release_date, track_links))
+        albums.sort(key=lambda x: (x[1] or "9999"))
+    return albums
+
+def get_release_date(album_table):
+    dl = album_table.find("dl", class_="clearfix")
+    if not dl:
+        return None
+    dt_tags = dl.find_all("dt")
+    for dt in dt_tags:
+        if dt.text.strip() == "発売日：":
+            dd = dt.find_next_sibling("dd")
+            if dd:
+                return dd.text.strip().split("/")[0]
+    return None
+
+def search_songs(song_title):
+    url = f"{BASE_URL}/search/?Aselect=2&Bselect=3&Keyword={requests.utils.quote(song_title)}"
+    return extract_song_results(get_page_text(url))
+
+def extract_song_results(html):
+    soup = parse_html(html, SONGLIST_STRAINER)
+    results = []
+    for row in soup.select("tbody.songlist-table-body tr.border-bottom"):
+        a_tag = row.select_one("td.sp-w-100 a")  # selects the <a> inside the first td cell
+        if not a_tag:
+            continue
+        href = a_tag.get("href")
+        full_url = BASE_URL + href
+        title_span = a_tag.select_one("span.songlist-title")
+        title = title_span.text.strip() if title_span else a_tag.text.strip()
+        tds = row.find_all("td")
+        artist_name = tds[1].text.strip() if len(tds) > 1 else "Unknown"
+        results.append((title, artist_name, full_url))
+        if len(results) >= 10:
+            break
+    # print(str(soup.select_one("tbody.songlist-table-body tr.border-bottom")))
+    # print(f"Title: {title}, Artist: {artist_name}, URL: {full_url}")
+    return results
+
+# -------- Obsidian export and artist sync --------------------------------------
+# Per-artist record of the songs already exported to the vault, keyed by the
+# uta-net song ID from /song/<id>/ URLs, so later syncs only fetch new ones.
+SYNC_STATE_FILENAME = ".uta-net-sync.json"
+SONG_ID_RE = re.compile(r"/song/(\d+)/")
+
+def song_id_from_url(url):
+    m = SONG_ID_RE.search(url or "")
+    return m.group(1) if m else None
+
+def sync_state_path(output_root, artist_name):
+    return os.path.join(output_root, "Lyrics", fs_safe(artist_name or ""), SYNC_STATE_FILENAME)
+
+def load_sync_state(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    if not isinstance(state, dict):
+        state = {}
+    state.setdefault("songs", {})
+    return state
+
+def save_sync_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def export_album_to_obsidian(artist_name, album, tracks, output_root, sync_state=None):
+    """Fetch an album's lyrics and write its Obsidian notes.
+
+    With sync_state, only tracks whose song ID is not recorded there are
+    fetched; an album with no new tracks costs no requests. Neighbours of
+    newly exported tracks are fetched again so their prev/next links pick
+    them up. Every fetched ID is recorded, with "lyrics": false when the
+    page had none, so instrumentals and removed songs aren't retried each
+    sync; a page that couldn't be fetched is left out so the next sync
+    tries it again. Returns the titles of the newly exported tracks.
+    """
+    # Use the largest number we can parse from any title as total_tracks
+    nums = [n for (t, _) in tracks if (n := parse_track_no(t))]
+    total_tracks = max(nums) if nums else len(tracks)
+
+    known = sync_state["songs"] if sync_state is not None else {}
+    new_positions = [i for i, (_, url) in enumerate(tracks) if song_id_from_url(url) not in known]
+    if not new_positions:
+        return []
+
+    lyrics_at = dict(zip(new_positions, fetch_lyrics_many(tracks[i][1] for i in new_positions)))
+    neighbours = sorted({
+        j for i, lyrics in lyrics_at.items() if lyrics
+        for j in (i - 1, i + 1)
+        if 0 <= j < len(tracks) and j not in lyrics_at
+        and known.get(song_id_from_url(tracks[j][1]), {}).get("lyrics", True)
+    })
+    lyrics_at.update(zip(neighbours, fetch_lyrics_many(tracks[j][1] for j in neighbours)))
+
+    album_tracks = []
+    added = []
+    for i in sorted(lyrics_at):
+        title, url = tracks[i]
+        lyrics = lyrics_at[i]
+        song_id = song_id_from_url(url)
+        is_new = song_id not in known
+        if is_new and sync_state is not None and song_id and lyrics is not None:
+            known[song_id] = {"album": album, "title": title, "lyrics": bool(lyrics)}
+        if not lyrics:
+            print(f"[⚠️] Missing lyrics for {title}")
+            continue
+
+        track_num = parse_track_no(title) or i + 1   # ← use the title’s number
+        album_tracks.append((
+            track_num,
+            strip_track_prefix(title),             # pretty title (no leading digits)
+            lyrics.strip().splitlines(),
+        ))
+        if is_new:
+            added.append(title)
+
+    if not album_tracks:
+        return added
+
+    # Whole album in one go: folder, prev/next map and furigana built once
+    generate_obsidian_album(
+        album_tracks,
+        artist=artist_name,
+        album=album,
+        total_tracks=total_tracks,                 # ← from parsed max
+        track_titles=[t for t, _ in tracks],
+        output_root=output_root
+    )
+    return added
+
+DOCX_SONG_DELIMITER = "\n\n" + "=" * 40 + "\n\n"
+
+def export_album_to_docx(artist_name, album, tracks, output_root):
+    """Fetch an album's lyrics into <output_root>/<artist>/<album>.docx.
+
+    Returns (docx_path, fetched_titles); docx_path is None when no track
+    had lyrics, in which case nothing is written.
+    """
+    all_lyrics = []
+    fetched = []
+    for (title, url), lyrics in zip(tracks, fetch_lyrics_many(url for _, url in tracks)):
+        if not lyrics:
+            print(f"[⚠️] Missing lyrics for {title}")
+            continue
+        clean_title = re.sub(r"^(\d+)\s+", r"\1. ", title)
+        all_lyrics.append(f"{clean_title}\n\n{lyrics}{DOCX_SONG_DELIMITER}")
+        fetched.append(title)
+
+    lyrics_text = "".join(all_lyrics)
+    if lyrics_text.endswith(DOCX_SONG_DELIMITER):
+        lyrics_text = lyrics_text[:lyrics_text.rfind(DOCX_SONG_DELIMITER)]
+    if not lyrics_text.strip():
+        return None, fetched
+
+    artist_dir = os.path.join(output_root, sanitize_filename(artist_name))
+    os.makedirs(artist_dir, exist_ok=True)
+    album_docx_path = os.path.join(artist_dir, sanitize_filename(album) + ".docx")
+    create_docx_from_lyrics(lyrics_text, album_docx_path)
+    return album_docx_path, fetched
@@ -0,0 +1,182 @@
+"""Headless batch export from uta-net, for servers and cron.
+
+    python lyricsretriever/utanet_batch.py artists.txt --output ~/Lyrics \\
+        --format obsidian docx --album "Best"
+
+The jobs file has one artist per line: a name to search for or a numeric
+uta-net artist ID, optionally followed by " | "-separated album filters
+that replace the --album ones for that artist. Blank lines and lines
+starting with "#" are ignored.
+
+Progress is written to stdout as one JSON object per line ("event" says
+which kind); everything else the scraper prints goes to stderr.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from lyricsretriever.utanet import (
+    HTTP_CACHE_FILENAME,
+    MAX_IN_FLIGHT,
+    RATE_BURST,
+    REQUESTS_PER_SECOND,
+    configure_rate_limit,
+    enable_http_cache,
+    export_album_to_docx,
+    export_album_to_obsidian,
+    fetch_artist_album_page,
+    get_albums_and_tracks,
+    http_stats,
+    load_sync_state,
+    save_sync_state,
+    search_artist,
+    sync_state_path,
+)
+from shared.JMRParser import enable_ruby_cache
+
+FORMATS = ("obsidian", "docx")
+# Furigana cache, kept in the output folder next to the page cache
+RUBY_CACHE_FILENAME = ".furigana-cache.sqlite3"
+
+_events_out = sys.stdout
+
+def emit(event, **fields):
+    _events_out.write(json.dumps({"event": event, **fields}, ensure_ascii=False) + "\n")
+    _events_out.flush()
+
+def read_jobs(path):
+    """Return (line_no, artist, album_filters) for each job in the file."""
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            artist, *filters = [part.strip() for part in line.split("|")]
+            jobs.append((line_no, artist, [f for f in filters if f]))
+    return jobs
+
+def resolve_artist(term):
+    """Return (artist_id, artist_name), or raise LookupError."""
+    if term.isdigit():
+        return term, f"Artist {term}"
+    candidates = search_artist(term)
+    if not candidates:
+        raise LookupError(f"No artist matches found for {term!r}")
+    exact = [c for c in candidates if c[1] == term]
+    if len(exact) == 1 or len(candidates) == 1:
+        return (exact or candidates)[0]
+    names = ", ".join(f"{name} (ID: {aid})" for aid, name in candidates)
+    raise LookupError(f"Several artists match {term!r}: {names}; use an artist ID")
+
+def album_matches(album_title, filters):
+    return not filters or any(f.casefold() in album_title.casefold() for f in filters)
+
+def run_job(term, album_filters, args):
+    artist_id, artist_name = resolve_artist(term)
+    albums = [a for a in get_albums_and_tracks(fetch_artist_album_page(artist_id))
+              if album_matches(a[0], album_filters)]
+    emit("artist", artist=artist_name, artist_id=artist_id, albums=len(albums))
+
+    state_path = sync_state_path(args.output, artist_name)
+    sync_state = None if args.all_songs else load_sync_state(state_path)
+    songs_added = 0
+    for album_title, release_date, tracks in albums:
+        if "obsidian" in args.format:
+            added = export_album_to_obsidian(
+                artist_name, album_title, tracks, args.output, sync_state=sync_state
+            )
+            songs_added += len(added)
+            emit("album", artist=artist_name, album=album_title, format="obsidian",
+                 tracks=len(tracks), added=added)
+        if "docx" in args.format:
+            docx_path, fetched = export_album_to_docx(artist_name, album_title, tracks, args.output)
+            emit("album", artist=artist_name, album=album_title, format="docx",
+                 tracks=len(tracks), fetched=len(fetched), path=docx_path)
+    if sync_state is not None:
+        save_sync_state(state_path, sync_state)
+    return len(albums), songs_added
+
+def positive(convert):
+    """argparse type: convert, then reject values <= 0."""
+    def check(text):
+        value = convert(text)
+        if value <= 0:
+            raise argparse.ArgumentTypeError(f"must be greater than 0: {text}")
+        return value
+    check.__name__ = convert.__name__  # argparse names the type in its errors
+    return check
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export uta-net lyrics for a list of artists.")
+    parser.add_argument("jobs", help="file with one artist name or ID per line")
+    parser.add_argument("-o", "--output", default="lyrics", help="output folder (default: %(default)s)")
+    parser.add_argument("-f", "--format", nargs="+", choices=FORMATS, default=["obsidian"],
+                        help="what to write for each album (default: obsidian)")
+    parser.add_argument("-a", "--album", action="append", default=[],
+                        help="only albums whose title contains this text; repeatable")
+    parser.add_argument("--all-songs", action="store_true",
+                        help="re-export every song instead of only those missing from the sync state")
+    parser.add_argument("--rate", type=positive(float), default=REQUESTS_PER_SECOND,
+                        help="requests per second (default: %(default)s)")
+    parser.add_argument("--burst", type=positive(int), default=RATE_BURST,
+                        help="requests allowed back to back (default: %(default)s)")
+    parser.add_argument("--max-in-flight", type=positive(int), default=MAX_IN_FLIGHT,
+                        help="concurrent requests (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="don't cache fetched pages on disk")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        jobs = read_jobs(args.jobs)
+    except OSError as e:
+        emit("error", message=str(e))
+        return 2
+
+    started = time.perf_counter()
+    try:
+        os.makedirs(args.output, exist_ok=True)
+    except OSError as e:
+        emit("error", message=str(e))
+        return 2
+    configure_rate_limit(args.rate, args.burst, args.max_in_flight)
+    emit("start", jobs=len(jobs), formats=args.format, output=os.path.abspath(args.output))
+    # Both caches are optional: an unwritable one is reported and skipped
+    caches = [(enable_ruby_cache, RUBY_CACHE_FILENAME)]
+    if not args.no_cache:
+        caches.append((enable_http_cache, HTTP_CACHE_FILENAME))
+    for enable_cache, filename in caches:
+        try:
+            enable_cache(os.path.join(args.output, filename))
+        except (OSError, sqlite3.Error) as e:
+            emit("warning", message=f"{filename} disabled: {e}")
+
+    albums = songs_added = failed = 0
+    # Scraper diagnostics are printed; keep stdout for the JSON events
+    with redirect_stdout(sys.stderr):
+        for line_no, term, filters in jobs:
+            try:
+                job_albums, job_added = run_job(term, filters or args.album, args)
+            except Exception as e:
+                failed += 1
+                emit("error", line=line_no, artist=term, message=str(e))
+                continue
+            albums += job_albums
+            songs_added += job_added
+
+    emit("done", jobs=len(jobs), failed=failed, albums=albums, songs_added=songs_added,
+         requests=http_stats["requests"], connections=http_stats["connections"],
+         cache_hits=http_stats["cache_hits"], seconds=round(time.perf_counter() - started, 2))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,49 @@
 import os, sys, logging, time, re, json
-import requests
+import threading
 import zipfile
-import openpyxl, time
-from openpyxl.styles import Font
-from typing import List, Optional
-from docx import Document
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
-from docx.shared import Pt
-from pykakasi import kakasi
-
-
-kks = kakasi()
+import io
+import sqlite3
+import hashlib
+import importlib.metadata
+from contextlib import closing, contextmanager
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Union
+from collections import deque
+from itertools import islice
+
+# requests, openpyxl, python-docx and pykakasi are imported inside the
+# functions that use them, so each entry point only pays for what it uses.
+
+kks = None
+
+def get_kakasi():
+    """Return the shared kakasi instance, creating it on first use."""
+    global kks
+    if kks is None:
+        from pykakasi import kakasi
+        kks = kakasi()
+    return kks
+
+# Max number of single-character / short-token readings kept in memory
+READING_CACHE_SIZE = 4096
+
+def _build_reading_cache(maxsize: Optional[int]):
+    @lru_cache(maxsize=maxsize)
+    def _reading(text: str) -> str:
+        items = get_kakasi().convert(text)
+        return items[0]["hira"] if items else ""
+    return _reading
+
+_cached_reading = _build_reading_cache(READING_CACHE_SIZE)
+
+def configure_reading_cache(maxsize: Optional[int] = READING_CACHE_SIZE) -> None:
+    """Resize (and clear) the reading cache. None means unbounded."""
+    global _cached_reading
+    _cached_reading = _build_reading_cache(maxsize)
+
+def reading_cache_info():
+    """Return hits/misses/maxsize/currsize of the reading cache."""
+    return _cached_reading.cache_info()
 
 # Mapping of counters with their special readings
 COUNTER_MAPPINGS = {
@@ -50,15 +82,231 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s: %(message)s",
     encoding="utf-8"
 )
+
+# -------- Persistent ruby-pair cache ---------------------------------------
+# Optional SQLite store of convert_line_to_ruby_pairs results keyed by line
+# text. Off until enable_ruby_cache() is called.
+DEFAULT_RUBY_CACHE_PATH = os.path.join(os.path.dirname(sys.argv[0]), "furigana_cache.sqlite3")
+RUBY_CACHE_MAX_ENTRIES = 200_000
+# Bump whenever convert_line_to_ruby_pairs starts producing different output
+_RUBY_RULES_REVISION = 3
+_SQLITE_MAX_PARAMS = 500
+
+_ruby_cache_path = None
+_ruby_cache_max_entries = RUBY_CACHE_MAX_ENTRIES
+
+def enable_ruby_cache(path: str = DEFAULT_RUBY_CACHE_PATH, max_entries: int = RUBY_CACHE_MAX_ENTRIES) -> None:
+    global _ruby_cache_path, _ruby_cache_max_entries
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ruby_pairs ("
+            "line TEXT PRIMARY KEY, pairs TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ruby_pairs_last_used ON ruby_pairs (last_used)")
+    _ruby_cache_path = path
+    _ruby_cache_max_entries = max_entries
+
+def disable_ruby_cache() -> None:
+    global _ruby_cache_path
+    _ruby_cache_path = None
+
+def _ruby_rules_hash() -> str:
+    """Hash of everything that affects the pairs, so edits to the tables invalidate the cache."""
+    try:
+        kakasi_version = importlib.metadata.version("pykakasi")
+    except importlib.metadata.PackageNotFoundError:
+        kakasi_version = "unknown"
+    payload = json.dumps(
+        [_RUBY_RULES_REVISION, kakasi_version, COUNTER_MAPPINGS, PREFERRED_READING],
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _ruby_cache_get(lines) -> dict:
+    found = {}
+    rules = _ruby_rules_hash()
+    lines = list(lines)
+    try:
+        with closing(sqlite3.connect(_ruby_cache_path)) as conn, conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'rules'").fetchone()
+            if row is None or row[0] != rules:
+                conn.execute("DELETE FROM ruby_pairs")
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rules', ?)", (rules,))
+                return found
+            for start in range(0, len(lines), _SQLITE_MAX_PARAMS):
+                chunk = lines[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                for line, pairs in conn.execute(
+                    f"SELECT line, pairs FROM ruby_pairs WHERE line IN ({placeholders})", chunk
+                ):
+                    found[line] = [tuple(pair) for pair in json.loads(pairs)]
+            now = time.time()
+            conn.executemany(
+                "UPDATE ruby_pairs SET last_used = ? WHERE line = ?",
+                [(now, line) for line in found]
+            )
+    except sqlite3.Error as e:
+        logging.warning(f"Ruby cache lookup failed: {e}")
+    return found
+
+def _ruby_cache_put(converted: dict) -> None:
+    now = time.time()
+    try:
+        with closing(sqlite3.connect(_ruby_cache_path)) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ruby_pairs (line, pairs, last_used) VALUES (?, ?, ?)",
+                [(line, json.dumps(pairs, ensure_ascii=False), now) for line, pairs in converted.items()]
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM ruby_pairs").fetchone()
+            if count > _ruby_cache_max_entries:
+                # evict least recently used
+                conn.execute(
+                    "DELETE FROM ruby_pairs WHERE line IN "
+                    "(SELECT line FROM ruby_pairs ORDER BY last_used LIMIT ?)",
+                    (count - _ruby_cache_max_entries,)
+                )
+    except sqlite3.Error as e:
+        logging.warning(f"Ruby cache update failed: {e}")
+
+# -------- Persistent translation memory -------------------------------------
+# Optional SQLite store of offline translations keyed by model identity and
+# source line. Off until enable_translation_memory() is called.
+DEFAULT_TRANSLATION_MEMORY_PATH = os.path.join(os.path.dirname(sys.argv[0]), "translation_memory.sqlite3")
+
+_translation_memory_path = None
+# "<from_code>-><to_code>@<package_version>", set by heavy_initialization()
+translation_model_id = None
+translation_memory_stats = {"hits": 0, "misses": 0}
+
+def enable_translation_memory(path: str = DEFAULT_TRANSLATION_MEMORY_PATH) -> None:
+    global _translation_memory_path
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "model TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL, "
+            "PRIMARY KEY (model, source))"
+        )
+    _translation_memory_path = path
+
+def disable_translation_memory() -> None:
+    global _translation_memory_path
+    _translation_memory_path = None
+
+def translation_memory_hit_rate() -> float:
+    lookups = translation_memory_stats["hits"] + translation_memory_stats["misses"]
+    return translation_memory_stats["hits"] / lookups if lookups else 0.0
+
+def _translation_memory_get(sources: List[str]) -> dict:
+    found = {}
+    try:
+        with closing(sqlite3.connect(_translation_memory_path)) as conn:
+            for start in range(0, len(sources), _SQLITE_MAX_PARAMS):
+                chunk = sources[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(conn.execute(
+                    f"SELECT source, target FROM translations WHERE model = ? AND source IN ({placeholders})",
+                    [translation_model_id, *chunk]
+                ))
+    except sqlite3.Error as e:
+        logging.warning(f"Translation memory lookup failed: {e}")
+    translation_memory_stats["hits"] += len(found)
+    translation_memory_stats["misses"] += len(sources) - len(found)
+    return found
+
+def _translation_memory_put(translations: dict) -> None:
+    try:
+        with closing(sqlite3.connect(_translation_memory_path)) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO translations (model, source, target) VALUES (?, ?, ?)",
+                [(translation_model_id, source, target) for source, target in translations.items()]
+            )
+    except sqlite3.Error as e:
+        logging.warning(f"Translation memory update failed: {e}")
+
 def get_metadata_from_zip(model_path):
     with zipfile.ZipFile(model_path, 'r') as zip_file:
         with zip_file.open('package.argosmodel') as model_file:
             return json.loads(model_file.read().decode('utf-8'))
-        
-def heavy_initialization():
-    global translator
+
+# Records that the bundled model was already checked/installed, keyed on the
+# zip's size and mtime, so later launches can skip the zip and package scan.
+TRANSLATOR_READY_MARKER_PATH = os.path.join(os.path.dirname(sys.argv[0]), "translator_ready.json")
+WARM_UP_TEXT = "こんにちは"
+
+# Seconds spent in each heavy_initialization phase, for the log / UI
+translator_init_timings = {}
+_warm_up_thread = None
+
+def _read_ready_marker(model_path: str, stat: os.stat_result) -> Optional[dict]:
+    try:
+        with open(TRANSLATOR_READY_MARKER_PATH, encoding="utf-8") as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (marker.get("model_path") == model_path and marker.get("size") == stat.st_size
+            and marker.get("mtime") == stat.st_mtime):
+        return marker.get("metadata")
+    return None
+
+def _write_ready_marker(model_path: str, stat: os.stat_result, metadata: dict) -> None:
+    marker = {
+        "model_path": model_path,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "metadata": {key: metadata.get(key) for key in ("from_code", "to_code", "package_version")},
+    }
+    try:
+        with open(TRANSLATOR_READY_MARKER_PATH, "w", encoding="utf-8") as f:
+            json.dump(marker, f)
+    except OSError as e:
+        logging.warning(f"Could not write translator ready marker: {e}")
+
+def _install_model_if_missing(model_path: str, metadata: dict) -> None:
     import argostranslate.package
     import argostranslate.translate
+    installed = any(
+    pkg.from_code == metadata['from_code'] and pkg.to_code == metadata['to_code']
+    for pkg in argostranslate.translate.get_installed_packages()
+    )
+    if not installed:
+        argostranslate.package.install_from_path(model_path)
+
+def _resolve_translator():
+    import argostranslate.translate
+    installed_languages = argostranslate.translate.get_installed_languages()
+    ja = next((lang for lang in installed_languages if lang.code == "ja"), None)
+    en = next((lang for lang in installed_languages if lang.code == "en"), None)
+    return ja.get_translation(en) if ja and en else None
+
+def _warm_up_translator():
+    start = time.perf_counter()
+    try:
+        translator.translate(WARM_UP_TEXT)
+    except Exception as e:
+        logging.warning(f"Translator warm-up failed: {e}")
+    translator_init_timings["warm_up"] = time.perf_counter() - start
+    logging.info(f"Translator warm-up took {translator_init_timings['warm_up']:.2f}s")
+
+def wait_for_translator_warm_up() -> None:
+    if _warm_up_thread is not None:
+        _warm_up_thread.join()
+
+def heavy_initialization(warm_up: bool = False):
+    """Load the offline translator; with warm_up, load the model in a background thread too."""
+    global translator, translation_model_id, _warm_up_thread
+    translator_init_timings.clear()
+    phase_start = time.perf_counter()
+
+    def lap(phase):
+        nonlocal phase_start
+        now = time.perf_counter()
+        translator_init_timings[phase] = translator_init_timings.get(phase, 0.0) + now - phase_start
+        phase_start = now
+
+    import argostranslate.package
+    import argostranslate.translate
+    lap("import")
     if hasattr(sys, '_MEIPASS'):
         base_path = sys._MEIPASS
     else:
@@ -67,30 +315,84 @@ def heavy_initialization():
 
     model_path = os.path.join(base_path, "argos-translate", "packages", "ja_en.zip")
 
+    metadata = None
+    from_marker = False
     if os.path.exists(model_path):
-        metadata = get_metadata_from_zip(model_path)
-        from_code = metadata['from_code']
-        to_code = metadata['to_code']
-        installed = any(
-        pkg.from_code == from_code and pkg.to_code == to_code
-        for pkg in argostranslate.translate.get_installed_packages()
-        )
-        if not installed:
-            argostranslate.package.install_from_path(model_path)
+        stat = os.stat(model_path)
+        metadata = _read_ready_marker(model_path, stat)
+        from_marker = metadata is not None
+        if not from_marker:
+            metadata = get_metadata_from_zip(model_path)
+            lap("metadata")
+            _install_model_if_missing(model_path, metadata)
+            lap("package_check")
+            _write_ready_marker(model_path, stat, metadata)
+        translation_model_id = f"{metadata['from_code']}->{metadata['to_code']}@{metadata.get('package_version', '')}"
     else:
         print(f"Model not found: {model_path}")
 
-    installed_languages = argostranslate.translate.get_installed_languages()
-    ja = next((lang for lang in installed_languages if lang.code == "ja"), None)
-    en = next((lang for lang in installed_languages if lang.code == "en"), None)
-    translator = ja.get_translation(en) if ja and en else None
+    translator = _resolve_translator()
+    lap("languages")
+
+    if translator is None and from_marker:
+        # Marker is stale (package removed since it was written): do the full check
+        _install_model_if_missing(model_path, metadata)
+        lap("package_check")
+        translator = _resolve_translator()
+        lap("languages")
+
+    logging.info("Translator init: " + ", ".join(
+        f"{phase} {seconds:.2f}s" for phase, seconds in translator_init_timings.items()
+    ))
+
+    if warm_up and translator is not None:
+        _warm_up_thread = threading.Thread(target=_warm_up_translator, daemon=True)
+        _warm_up_thread.start()
+
+# -------- Script classification ---------------------------------------------
+# text.translate(_SCRIPT_TABLE) maps every character to a one-letter class in a
+# single C-level pass. ASCII is fully mapped, so a class letter can't collide
+# with an unmapped character (those are left as-is and count as "other").
+_KANJI, _HIRAGANA, _KATAKANA, _ASCII, _PUNCT = "K", "H", "T", "A", "P"
+
+def _build_script_table() -> dict:
+    table = {}
+    ranges = [
+        (0x0000, 0x007F, _PUNCT),    # ASCII; letters/digits overridden below
+        (0x0030, 0x0039, _ASCII),
+        (0x0041, 0x005A, _ASCII),
+        (0x0061, 0x007A, _ASCII),
+        (0x3000, 0x303F, _PUNCT),    # CJK symbols and punctuation
+        (0x3005, 0x3005, _KANJI),    # 々 iteration mark
+        (0x3040, 0x309F, _HIRAGANA),
+        (0x30A0, 0x30FF, _KATAKANA),
+        (0x3400, 0x4DBF, _KANJI),    # CJK Extension A
+        (0x4E00, 0x9FAF, _KANJI),
+        (0xFF01, 0xFF0F, _PUNCT),    # fullwidth punctuation
+        (0xFF1A, 0xFF20, _PUNCT),
+        (0xFF3B, 0xFF40, _PUNCT),
+        (0xFF5B, 0xFF65, _PUNCT),
+    ]
+    for start, end, script in ranges:
+        for cp in range(start, end + 1):
+            table[cp] = script
+    return table
+
+_SCRIPT_TABLE = _build_script_table()
+
+# Japanese letters, ASCII letters/digits, middle dot / long vowel mark
+_NAME_PART_RE = re.compile(r'[\u4E00-\u9FFF\u3040-\u30FFA-Za-z0-9・ー]')
 
 def is_kanji(char: str) -> bool:
-    return '一' <= char <= '龯'
+    return _SCRIPT_TABLE.get(ord(char)) == _KANJI
 
 def is_katakana(text: str) -> bool:
     """Return True if the entire string consists of Katakana characters."""
-    return bool(text) and all('\u30A0' <= ch <= '\u30FF' for ch in text)
+    return set(text.translate(_SCRIPT_TABLE)) == {_KATAKANA}
+
+def _is_name_suffix_context(prev_base: str) -> bool:
+    """Return True when previous token looks like a name part (so '君' is likely a suffix)."""
+    return bool(prev_base) and _NAME_PART_RE.search(prev_base) is not None
 
 def convert_line_to_ruby_pairs(line: str):
     def _replace_counters(text: str) -> str:
@@ -102,24 +404,32 @@ def convert_line_to_ruby_pairs(line: str):
         return _COUNTER_PATTERN.sub(_repl, text)
 
     line = _replace_counters(line)
+
+    # No kanji anywhere → nothing to annotate, skip kakasi entirely
+    if _KANJI not in line.translate(_SCRIPT_TABLE):
+        return [(line, None)]
+
     result = []
-    for item in kks.convert(line):
+    for item in get_kakasi().convert(line):
         orig = item['orig']
         hira = item['hira']
+        scripts = orig.translate(_SCRIPT_TABLE)
+        script_set = set(scripts)
 
         # Katakana → keep as-is (no ruby) and don't process it again
-        if is_katakana(orig):
+        if script_set == {_KATAKANA}:
             result.append((orig, None))
             continue
 
         # If the token has no kanji, leave it as-is
-        if not any(is_kanji(c) for c in orig):
+        if _KANJI not in script_set:
             result.append((orig, None))
             continue
 
         # If the token is entirely kanji, keep the existing mapping
-        if all(is_kanji(c) for c in orig):
-            result.append((orig, hira))
+        # (a lone 々 comes back as its own "reading": no ruby for that)
+        if script_set == {_KANJI}:
+            result.append((orig, hira if hira != orig else None))
             continue
 
         # Token has a mix of kanji and kana/punctuation
@@ -128,15 +438,15 @@ def convert_line_to_ruby_pairs(line: str):
         i = 0
         while i < len(chars):
             ch = chars[i]
-            if is_kanji(ch):
+            if scripts[i] == _KANJI:
                 # Determine contiguous kanji run
                 j = i
-                while j < len(chars) and is_kanji(chars[j]):
+                while j < len(chars) and scripts[j] == _KANJI:
                     j += 1
 
                 # Find reading boundary using the next non-kanji character
                 if j < len(chars):
-                    next_hira = kks.convert(chars[j])[0]["hira"]
+                    next_hira = _cached_reading(chars[j])
                     next_idx = hira.find(next_hira, idx)
                     if next_idx == -1:
                         next_idx = len(hira)
@@ -144,9 +454,15 @@ def convert_line_to_ruby_pairs(line: str):
                     next_idx = len(hira)
 
                 kanji_reading = hira[idx:next_idx]
-                run = chars[i:j]
-
-                if len(kanji_reading) == len(run):
+                # 々 repeats the kanji before it, so it shares that kanji's ruby
+                run = []
+                for kc in chars[i:j]:
+                    if kc == "々" and run:
+                        run[-1] += kc
+                    else:
+                        run.append(kc)
+
+                if len(kanji_reading) == len(run) == j - i:
                     for k, kc in enumerate(run):
                         result.append((kc, kanji_reading[k]))
                 else:
@@ -155,7 +471,7 @@ def convert_line_to_ruby_pairs(line: str):
                         if k == len(run) - 1:
                             reading = remaining
                         else:
-                            guess = kks.convert(kc)[0]["hira"]
+                            guess = _cached_reading(kc)
                             if remaining.startswith(guess):
                                 reading = guess
                                 if remaining:
@@ -166,30 +482,18 @@ def convert_line_to_ruby_pairs(line: str):
                                     remaining = remaining[1:]
                                 else:
                                     reading = guess or ""
-                        result.append((kc, reading))
+                        result.append((kc, reading if reading != kc else None))
 
                 idx = next_idx
                 i = j
             else:
-                ch_hira = kks.convert(ch)[0]["hira"]
+                ch_hira = _cached_reading(ch)
                 result.append((ch, None))
                 idx += len(ch_hira)
                 i += 1
 
     # -------- Preferred reading overrides ---------------------------------
 
-    def _is_name_suffix_context(prev_base: str) -> bool:
-        """Return True when previous token looks like a name part (so '君' is likely a suffix)."""
-        if not prev_base:
-            return False
-        # Japanese letters
-        if any('\u4E00' <= c <= '\u9FFF' or '\u3040' <= c <= '\u30FF' for c in prev_base):
-            return True
-        # ASCII letters/digits or middle dot / long vowel mark often used in names
-        if re.search(r'[A-Za-z0-9]', prev_base) or '・' in prev_base or 'ー' in prev_base:
-            return True
-        return False
-
     for n, (base, reading) in enumerate(result):
         pref = PREFERRED_READING.get(base)
         if not pref or not reading:
@@ -211,12 +515,66 @@ def convert_line_to_ruby_pairs(line: str):
 
     return result
 
-def add_ruby_eq_field(paragraph, base_text, ruby_text, base_font_size_pt=16):
+def convert_lines_to_ruby_pairs(lines: List[str]):
+    """Convert a whole document; returns one convert_line_to_ruby_pairs result per line.
+
+    Lyrics repeat a lot (choruses), so every distinct line is converted once
+    and the pairs are reused for each occurrence. When the persistent cache is
+    enabled, lines seen in earlier runs are not converted at all.
+    """
+    lines = list(lines)
+    converted = _ruby_cache_get(set(lines)) if _ruby_cache_path else {}
+    new_pairs = {}
+    result = []
+    for line in lines:
+        pairs = converted.get(line)
+        if pairs is None:
+            pairs = converted[line] = new_pairs[line] = convert_line_to_ruby_pairs(line)
+        result.append(list(pairs))
+    if _ruby_cache_path and new_pairs:
+        _ruby_cache_put(new_pairs)
+    return result
+
+def _eq_field_instruction(base_text, ruby_text, furigana_hps=18):
+    # Furigana size in half-points (hps18 = 9pt), adjust if needed
+    return (
+        f'EQ \\* jc2 \\* "Font:Noto Sans JP Light" \\* hps{furigana_hps} '
+        f'\\o\\ad(\\s\\up 17({ruby_text}),{base_text})'
+    )
+
+def _character_style_id(paragraph, style):
+    """Style id for a character style given by name or style object.
+
+    Style objects are used as-is; python-docx's own resolution scans the
+    whole style sheet for the default style on every run.
+    """
+    from docx.enum.style import WD_STYLE_TYPE
+
+    if style is None:
+        return None
+    if hasattr(style, "style_id"):
+        return style.style_id
+    return paragraph.part.get_style_id(style, WD_STYLE_TYPE.CHARACTER)
+
+def _add_styled_run(paragraph, text=None, style=None):
+    run = paragraph.add_run(text)
+    style_id = _character_style_id(paragraph, style)
+    if style_id is not None:
+        run._r.style = style_id
+    return run
+
+def add_ruby_eq_field(paragraph, base_text, ruby_text, base_font_size_pt=16, style=None):
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    from docx.shared import Pt
+
     # Create the run that will hold the field
-    run_instr = paragraph.add_run()
+    run_instr = _add_styled_run(paragraph, style=style)
     
-    # Set the font size of the run (this controls base text size)
-    run_instr.font.size = Pt(base_font_size_pt)
+    # Set the font size of the run (this controls base text size),
+    # unless a character style already carries it
+    if style is None:
+        run_instr.font.size = Pt(base_font_size_pt)
     
     fldChar_begin = OxmlElement('w:fldChar')
     fldChar_begin.set(qn('w:fldCharType'), 'begin')
@@ -224,20 +582,184 @@ def add_ruby_eq_field(paragraph, base_text, ruby_text, base_font_size_pt=16):
 
     instr_text = OxmlElement('w:instrText')
     instr_text.set(qn('xml:space'), 'preserve')
-
-    # Furigana size in half-points (hps18 = 9pt), adjust if needed
-    furigana_hps = 18  
-
-    instr_text.text = (
-        f'EQ \\* jc2 \\* "Font:Noto Sans JP Light" \\* hps{furigana_hps} '
-        f'\\o\\ad(\\s\\up 17({ruby_text}),{base_text})'
-    )
+    instr_text.text = _eq_field_instruction(base_text, ruby_text)
     run_instr._r.append(instr_text)
 
     fldChar_end = OxmlElement('w:fldChar')
     fldChar_end.set(qn('w:fldCharType'), 'end')
     run_instr._r.append(fldChar_end)
 
+# Native ruby settings mirroring the EQ field: \\* jc2 (distribute space),
+# hps18 furigana, raised 17pt over 16pt base text.
+RUBY_ALIGN = "distributeSpace"
+RUBY_HPS = 18
+RUBY_HPS_RAISE = 34
+RUBY_HPS_BASE_TEXT = 32
+RUBY_LANGUAGE_ID = "ja-JP"
+
+def add_ruby_element(paragraph, base_text, ruby_text, style=None):
+    """Append base_text with ruby_text as a native w:ruby run (no field code)."""
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    style_id = _character_style_id(paragraph, style)
+
+    def styled_run(text, size_hps=None):
+        r = OxmlElement('w:r')
+        if style_id is not None or size_hps is not None:
+            rPr = OxmlElement('w:rPr')
+            if style_id is not None:
+                rStyle = OxmlElement('w:rStyle')
+                rStyle.set(qn('w:val'), style_id)
+                rPr.append(rStyle)
+            if size_hps is not None:
+                sz = OxmlElement('w:sz')
+                sz.set(qn('w:val'), str(size_hps))
+                rPr.append(sz)
+            r.append(rPr)
+        t = OxmlElement('w:t')
+        t.text = text
+        r.append(t)
+        return r
+
+    run = _add_styled_run(paragraph, style=style)
+
+    ruby = OxmlElement('w:ruby')
+    rubyPr = OxmlElement('w:rubyPr')
+    for tag, val in (
+        ('w:rubyAlign', RUBY_ALIGN),
+        ('w:hps', RUBY_HPS),
+        ('w:hpsRaise', RUBY_HPS_RAISE),
+        ('w:hpsBaseText', RUBY_HPS_BASE_TEXT),
+        ('w:lid', RUBY_LANGUAGE_ID),
+    ):
+        el = OxmlElement(tag)
+        el.set(qn('w:val'), str(val))
+        rubyPr.append(el)
+    ruby.append(rubyPr)
+
+    rt = OxmlElement('w:rt')
+    rt.append(styled_run(ruby_text, RUBY_HPS))
+    ruby.append(rt)
+
+    rubyBase = OxmlElement('w:rubyBase')
+    rubyBase.append(styled_run(base_text))
+    ruby.append(rubyBase)
+
+    run._r.append(ruby)
+
+_TRACK_NO_RE = re.compile(r'^\s*(\d{1,3})\s*[\.．]?\s*')
+
+def _parse_track_no(title: str) -> int | None:
+    m = _TRACK_NO_RE.match(title or "")
+    return int(m.group(1)) if m else None
+
+def _strip_track_prefix(title: str) -> str:
+    return _TRACK_NO_RE.sub("", title or "").strip()
+
+def _pairs_to_furigana(pairs) -> str:
+    return ''.join(
+        f'{{{base}|{reading}}}' if reading and base != reading else base
+        for base, reading in pairs
+    )
+
+def _has_lyrics(lyrics_lines) -> bool:
+    return bool(lyrics_lines) and any((ln or "").strip() for ln in lyrics_lines)
+
+def _album_folder(output_root: str, artist: str, album: str) -> str:
+    return os.path.join(output_root, "Lyrics", fs_safe(artist or ""), fs_safe(album or ""))
+
+def _track_note_names(track_titles: List[str]) -> dict:
+    """Album number -> note name (without .md), for the prev/next links."""
+    num_to_title = {}
+    for t in track_titles:
+        n = _parse_track_no(t)
+        if n:  # only map those we can number
+            num_to_title.setdefault(n, _strip_track_prefix(t))
+    return {n: f"{n:02d}. {fs_safe(title)}" for n, title in num_to_title.items()}
+
+# Per-album manifest of note content hashes, so unchanged notes are not
+# rewritten (which would make Obsidian re-index and sync them). Dotfiles
+# are ignored by Obsidian.
+OBSIDIAN_MANIFEST_NAME = ".furigana-manifest.json"
+obsidian_export_stats = {"written": 0, "skipped": 0}
+
+def _load_obsidian_manifest(folder_path: str) -> dict:
+    try:
+        with open(os.path.join(folder_path, OBSIDIAN_MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+def _save_obsidian_manifest(folder_path: str, manifest: dict) -> None:
+    path = os.path.join(folder_path, OBSIDIAN_MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _note_up_to_date(file_path: str, filename: str, note: str, digest: str, manifest: dict) -> bool:
+    if not os.path.exists(file_path):
+        return False
+    if filename in manifest:
+        return manifest[filename] == digest
+    # Vault written before the manifest existed: compare with what is on disk
+    try:
+        with open(file_path, encoding="utf-8") as f:
+            return f.read() == note
+    except (OSError, UnicodeDecodeError):
+        return False
+
+def _write_note_if_changed(folder_path: str, filename: str, note: str, manifest: dict) -> str:
+    """Write note unless the file already has this content; updates manifest and obsidian_export_stats."""
+    file_path = os.path.join(folder_path, filename)
+    digest = hashlib.sha256(note.encode("utf-8")).hexdigest()
+    if _note_up_to_date(file_path, filename, note, digest, manifest):
+        obsidian_export_stats["skipped"] += 1
+    else:
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(note)
+        obsidian_export_stats["written"] += 1
+    manifest[filename] = digest
+    return file_path
+
+def obsidian_export_summary() -> str:
+    return (
+        f"{obsidian_export_stats['written']} written, "
+        f"{obsidian_export_stats['skipped']} unchanged"
+    )
+
+def _render_obsidian_note(song_title, artist, album, track_number, total_tracks,
+                          note_names: dict, stripped: List[str], all_pairs) -> str:
+    prev_num = track_number - 1 if track_number > 1 else None
+    next_num = track_number + 1 if track_number < total_tracks else None
+    previous_filename = note_names.get(prev_num) if prev_num else None
+    next_filename = note_names.get(next_num) if next_num else None
+
+    parts = [
+        "---\n",
+        f"title: {song_title}\n",     # display title (unsanitized)
+        f"artist: {artist}\n",
+        f"album: {album}\n",
+        f"track: {track_number}\n",
+        "tags: [lyrics, japanese, furigana]\n",
+        "language: ja\n",
+        "---\n\n",
+    ]
+    if previous_filename:
+        parts.append(f"← [[{previous_filename}]]\n")
+    parts.append("[[link]]\n\n")
+
+    for s, pairs in zip(stripped, all_pairs):
+        parts.append((_pairs_to_furigana(pairs) if s else "") + "\n")
+
+    parts.append("\n")
+    if next_filename:
+        parts.append(f"[[{next_filename}]] →\n")
+    parts.append("\n[[link]]\n")
+    return "".join(parts)
+
 def generate_obsidian_lyric_file(
     lyrics_lines: List[str],
     song_title: str,           # display title (unsanitized; e.g., "AM6:30")
@@ -249,86 +771,143 @@ def generate_obsidian_lyric_file(
     output_root: str = "Lyrics"
 ):
     # 0) Skip if there are no real lyrics
-    if not lyrics_lines or not any((ln or "").strip() for ln in lyrics_lines):
+    if not _has_lyrics(lyrics_lines):
         return None
 
-    # Helpers (local so this function is self-contained)
-    TRACK_NO_RE = re.compile(r'^\s*(\d{1,3})\s*[\.．]?\s*')
-    def parse_track_no(title: str) -> int | None:
-        m = TRACK_NO_RE.match(title or "")
-        return int(m.group(1)) if m else None
-    def strip_track_prefix(title: str) -> str:
-        return TRACK_NO_RE.sub("", title or "").strip()
-    def sanitize_filename(text: str) -> str:
-        # safe for Windows/macOS/Linux
-        text = re.sub(r'[<>:"/\\|?*`#^\[\]]+', "_", text or "")
-        return text.rstrip(" .") or "_"
-
-    def line_to_furigana(line: str) -> str:
-        pairs = convert_line_to_ruby_pairs(line)
-        return ''.join(
-            f'{{{base}|{reading}}}' if reading and base != reading else base
-            for base, reading in pairs
-        )
-
     # 1) Paths
-    folder_path = os.path.join(
-        output_root, "Lyrics",
-        sanitize_filename(artist),
-        sanitize_filename(album),
-    )
+    folder_path = _album_folder(output_root, artist, album)
     os.makedirs(folder_path, exist_ok=True)
 
-    filename = f"{track_number:02d}. {sanitize_filename(song_title)}.md"
-    file_path = os.path.join(folder_path, filename)
+    filename = f"{track_number:02d}. {fs_safe(song_title or '')}.md"
 
-    # 2) Build map: album number -> plain title (for accurate prev/next)
-    num_to_title = {}
-    for t in track_titles:
-        n = parse_track_no(t)
-        if n:  # only map those we can number
-            num_to_title.setdefault(n, strip_track_prefix(t))
+    # 2) Render, and write the file only if its content changed
+    stripped = [(line or "").strip() for line in lyrics_lines]
+    note = _render_obsidian_note(
+        song_title, artist, album, track_number, total_tracks,
+        _track_note_names(track_titles), stripped, convert_lines_to_ruby_pairs(stripped)
+    )
+    manifest = _load_obsidian_manifest(folder_path)
+    file_path = _write_note_if_changed(folder_path, filename, note, manifest)
+    _save_obsidian_manifest(folder_path, manifest)
 
-    prev_num = track_number - 1 if track_number > 1 else None
-    next_num = track_number + 1 if track_number < total_tracks else None
+    return file_path
 
-    previous_filename = (
-        f"{prev_num:02d}. {sanitize_filename(num_to_title[prev_num])}"
-        if (prev_num and prev_num in num_to_title) else None
-    )
-    next_filename = (
-        f"{next_num:02d}. {sanitize_filename(num_to_title[next_num])}"
-        if (next_num and next_num in num_to_title) else None
+def generate_obsidian_album(
+    tracks: List[tuple],        # (track_number, song_title, lyrics_lines) per track
+    artist: str,
+    album: str,
+    total_tracks: Optional[int] = None,         # highest album number; defaults to the largest track_number
+    track_titles: Optional[List[str]] = None,   # raw titles (may include numbers), incl. tracks without lyrics
+    output_root: str = "Lyrics"
+) -> List[str]:
+    """Write one Obsidian note per track, same as generate_obsidian_lyric_file for each.
+
+    The folder, the prev/next map and the furigana for every track's lyrics
+    are built once for the whole album. Tracks without lyrics are skipped,
+    and so are notes whose content is unchanged since the last export
+    (see obsidian_export_stats). Returns the note paths, in track order.
+    """
+    tracks = [t for t in tracks if _has_lyrics(t[2])]
+    if not tracks:
+        return []
+    if total_tracks is None:
+        total_tracks = max(number for number, _, _ in tracks)
+    if track_titles is None:
+        track_titles = [f"{number}. {title}" for number, title, _ in tracks]
+
+    folder_path = _album_folder(output_root, artist, album)
+    os.makedirs(folder_path, exist_ok=True)
+    note_names = _track_note_names(track_titles)
+
+    # One conversion pass over all lyrics, then split back per track
+    stripped_per_track = [[(line or "").strip() for line in lines] for _, _, lines in tracks]
+    all_pairs = convert_lines_to_ruby_pairs([s for stripped in stripped_per_track for s in stripped])
+
+    manifest = _load_obsidian_manifest(folder_path)
+    written, skipped = obsidian_export_stats["written"], obsidian_export_stats["skipped"]
+    paths = []
+    offset = 0
+    for (track_number, song_title, _), stripped in zip(tracks, stripped_per_track):
+        pairs = all_pairs[offset:offset + len(stripped)]
+        offset += len(stripped)
+        note = _render_obsidian_note(
+            song_title, artist, album, track_number, total_tracks, note_names, stripped, pairs
+        )
+        filename = f"{track_number:02d}. {fs_safe(song_title or '')}.md"
+        paths.append(_write_note_if_changed(folder_path, filename, note, manifest))
+    _save_obsidian_manifest(folder_path, manifest)
+
+    logging.info(
+        f"Obsidian export {artist} / {album}: "
+        f"{obsidian_export_stats['written'] - written} written, "
+        f"{obsidian_export_stats['skipped'] - skipped} unchanged"
     )
+    return paths
 
-    # 3) Write file
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write("---\n")
-        f.write(f"title: {song_title}\n")     # display title (unsanitized)
-        f.write(f"artist: {artist}\n")
-        f.write(f"album: {album}\n")
-        f.write(f"track: {track_number}\n")
-        f.write("tags: [lyrics, japanese, furigana]\n")
-        f.write("language: ja\n")
-        f.write("---\n\n")
-
-        if previous_filename:
-            f.write(f"← [[{previous_filename}]]\n")
-        f.write("[[link]]\n\n")
-
-        for line in lyrics_lines:
-            s = (line or "").strip()
-            f.write((line_to_furigana(s) if s else "") + "\n")
-
-        f.write("\n")
-        if next_filename:
-            f.write(f"[[{next_filename}]] →\n")
-        f.write("\n[[link]]\n")
 
-    return file_path
+# Renderer input: a path, the text itself, an open text stream or an
+# iterable of lines. An os.PathLike is always a path; a str is a path only
+# if it names an existing file, otherwise it is the text.
+TextSource = Union[str, os.PathLike, Iterable[str]]
+
+def _is_path_source(source) -> bool:
+    return isinstance(source, os.PathLike) or (isinstance(source, str) and os.path.isfile(source))
+
+@contextmanager
+def _open_source_lines(source: TextSource):
+    """Lines of source, as iterating an open text file would give them."""
+    if _is_path_source(source):
+        with open(source, "r", encoding="utf-8") as f:
+            yield f
+    elif isinstance(source, str):
+        yield io.StringIO(source, newline=None)
+    else:
+        # Streams stay open; they belong to the caller
+        yield source
+
+def _iter_source_lines(source: TextSource) -> Iterator[str]:
+    with _open_source_lines(source) as lines:
+        yield from lines
+
+@contextmanager
+def _open_text_sink(target):
+    """Text stream for target: a path, a text stream or a binary stream (written as UTF-8)."""
+    if not hasattr(target, "write"):
+        with open(target, "w", encoding="utf-8") as f:
+            yield f
+    elif isinstance(target, io.TextIOBase):
+        yield target
+    else:
+        wrapper = io.TextIOWrapper(target, encoding="utf-8")
+        try:
+            yield wrapper
+        finally:
+            wrapper.flush()
+            wrapper.detach()
+
+# Character style shared by every lyric run, so runs carry a single rStyle
+# reference instead of repeating size and font properties.
+LYRIC_CHAR_STYLE = "Lyric Text"
+LYRIC_CHAR_STYLE_ID = "LyricText"
+
+def _coalesce_plain_pairs(pairs):
+    """Merge adjacent unannotated pairs so they become a single run."""
+    merged = []
+    for base, reading in pairs:
+        if not reading and merged and not merged[-1][1]:
+            merged[-1] = (merged[-1][0] + base, None)
+        else:
+            merged.append((base, reading))
+    return merged
 
+def _new_lyrics_document():
+    """Empty python-docx Document with the 'Normal' style set up for lyrics."""
+    from docx import Document
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    from docx.shared import Pt
 
-def create_docx_with_eq_fields(input_path, output_path):
     document = Document()
     # Safely get and configure 'Normal' style
     style = document.styles['Normal']
@@ -347,129 +926,487 @@ def create_docx_with_eq_fields(input_path, output_path):
     paragraph_format.line_spacing = 1.0
     paragraph_format.space_after = Pt(0)
 
-    with open(input_path, encoding='utf-8') as f:
-        lines = f.readlines() 
-
-    for line in lines:
+    # Lyric runs: 16pt Noto Sans JP Light, east Asian font included
+    lyric_style = document.styles.add_style(LYRIC_CHAR_STYLE, WD_STYLE_TYPE.CHARACTER)
+    lyric_style.font.size = Pt(16)
+    lyric_style.font.name = 'Noto Sans JP Light'
+    lyric_style._element.rPr.rFonts.set(qn('w:eastAsia'), 'Noto Sans JP Light')
+    return document
+
+def _write_docx_python_docx(lines: Iterable[str], output_path, ruby_mode: str = "eq") -> None:
+    document = _new_lyrics_document()
+    all_pairs = convert_lines_to_ruby_pairs(list(lines))
+    add_ruby = add_ruby_element if ruby_mode == "ruby" else add_ruby_eq_field
+    # Resolve the style once; looking it up by name costs a scan per run
+    lyric_style = document.styles[LYRIC_CHAR_STYLE]
+
+    for pairs in all_pairs:
         p = document.add_paragraph()
-        
-        pairs = convert_line_to_ruby_pairs(line.rstrip("\n"))
 
-        for base, reading in pairs:
+        for base, reading in _coalesce_plain_pairs(pairs):
             if reading:
-                add_ruby_eq_field(p, base, reading)
+                add_ruby(p, base, reading, style=lyric_style)
             else:
-                run = p.add_run(base)
-                run.font.size = Pt(16)
-                run.font.name = 'Noto Sans JP Light'
-                r = run._element.rPr
-                rFonts = OxmlElement('w:rFonts')
-                rFonts.set(qn('w:eastAsia'), 'Noto Sans JP Light')
-                r.append(rFonts)
+                _add_styled_run(p, base, style=lyric_style)
 
         # insert a line break **within** the same paragraph
         # p.add_run().add_break()
 
     document.save(output_path)
 
+# -------- Streaming DOCX backend ------------------------------------------------
+# Writes word/document.xml straight into the zip from these fragments instead
+# of building an lxml tree. They reproduce python-docx's serialization of the
+# runs built above byte for byte.
+_LYRIC_RPR_XML = f'<w:rPr><w:rStyle w:val="{LYRIC_CHAR_STYLE_ID}"/></w:rPr>'
+_EQ_RUN_XML = (
+    '<w:r>' + _LYRIC_RPR_XML + '<w:fldChar w:fldCharType="begin"/>'
+    '<w:instrText xml:space="preserve">{instr}</w:instrText>'
+    '<w:fldChar w:fldCharType="end"/></w:r>'
+)
+_PLAIN_RUN_XML = '<w:r>' + _LYRIC_RPR_XML + '{content}</w:r>'
+_RUBY_RUN_XML = (
+    '<w:r>' + _LYRIC_RPR_XML + '<w:ruby><w:rubyPr>'
+    f'<w:rubyAlign w:val="{RUBY_ALIGN}"/><w:hps w:val="{RUBY_HPS}"/>'
+    f'<w:hpsRaise w:val="{RUBY_HPS_RAISE}"/><w:hpsBaseText w:val="{RUBY_HPS_BASE_TEXT}"/>'
+    f'<w:lid w:val="{RUBY_LANGUAGE_ID}"/></w:rubyPr>'
+    f'<w:rt><w:r><w:rPr><w:rStyle w:val="{LYRIC_CHAR_STYLE_ID}"/><w:sz w:val="{RUBY_HPS}"/></w:rPr>'
+    '<w:t>{ruby}</w:t></w:r></w:rt>'
+    '<w:rubyBase><w:r>' + _LYRIC_RPR_XML + '<w:t>{base}</w:t></w:r></w:rubyBase>'
+    '</w:ruby></w:r>'
+)
+
+@lru_cache(maxsize=1)
+def _docx_skeleton():
+    """Parts of an empty lyrics document: (zip entries, document.xml head, document.xml tail)."""
+    buffer = io.BytesIO()
+    _new_lyrics_document().save(buffer)
+    with zipfile.ZipFile(buffer) as zf:
+        entries = [(info, zf.read(info.filename)) for info in zf.infolist()]
+    document_xml = dict((info.filename, data) for info, data in entries)["word/document.xml"]
+    head, tail = document_xml.decode("utf-8").split("<w:sectPr", 1)
+    return entries, head.encode("utf-8"), ("<w:sectPr" + tail).encode("utf-8")
+
+def _xml_escape(text: str) -> str:
+    """Escape &, < and > like xml.sax.saxutils.escape, which imports urllib.request."""
+    return text.replace("&", "&amp;").replace(">", "&gt;").replace("<", "&lt;")
+
+def _run_text_xml(text: str) -> str:
+    """Run content for text, split into w:t / w:tab / w:br like python-docx does."""
+    if "\t" not in text and "\r" not in text and "\n" not in text:
+        chunks = [text]
+    else:
+        chunks = re.split(r"([\t\r\n])", text)
+    parts = []
+    for chunk in chunks:
+        if chunk == "\t":
+            parts.append("<w:tab/>")
+        elif chunk in ("\r", "\n"):
+            parts.append("<w:br/>")
+        elif chunk:
+            space = ' xml:space="preserve"' if len(chunk.strip()) < len(chunk) else ""
+            parts.append(f"<w:t{space}>{_xml_escape(chunk)}</w:t>")
+    return "".join(parts)
+
+def _paragraph_xml(pairs, ruby_mode: str = "eq") -> str:
+    runs = []
+    for base, reading in _coalesce_plain_pairs(pairs):
+        if reading and ruby_mode == "ruby":
+            runs.append(_RUBY_RUN_XML.format(base=_xml_escape(base), ruby=_xml_escape(reading)))
+        elif reading:
+            runs.append(_EQ_RUN_XML.format(instr=_xml_escape(_eq_field_instruction(base, reading))))
+        else:
+            runs.append(_PLAIN_RUN_XML.format(content=_run_text_xml(base)))
+    return f"<w:p>{''.join(runs)}</w:p>" if runs else "<w:p/>"
+
+def _write_docx_stream(lines: Iterable[str], output_path, ruby_mode: str = "eq") -> None:
+    entries, head, tail = _docx_skeleton()
+    with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zout:
+        for info, data in entries:
+            if info.filename != "word/document.xml":
+                zout.writestr(info, data)
+                continue
+            with zout.open(info, "w") as f:
+                f.write(head)
+                for chunk in _iter_chunks(lines, STREAM_CHUNK_SIZE):
+                    f.write("".join(
+                        _paragraph_xml(pairs, ruby_mode)
+                        for pairs in convert_lines_to_ruby_pairs(chunk)
+                    ).encode("utf-8"))
+                f.write(tail)
+
+_DOCX_BACKENDS = {
+    "python-docx": _write_docx_python_docx,
+    "stream": _write_docx_stream,
+}
+
+RUBY_MODES = ("eq", "ruby")
+
+def create_docx_with_eq_fields(input_path: TextSource, output_path, backend: str = "python-docx",
+                               ruby_mode: str = "eq"):
+    """Write input_path as a .docx with furigana.
+
+    ruby_mode="eq" writes each reading as an EQ field code; ruby_mode="ruby"
+    writes native w:ruby elements, which Word lays out without evaluating
+    a field per kanji.
+
+    backend="stream" writes document.xml straight into the zip, a chunk of
+    lines at a time, instead of building it with python-docx; the result is
+    the same document, built faster and in flat memory.
+
+    input_path may also be the text itself (a str that isn't the path of
+    an existing file), an open text stream or an iterable of lines, and
+    output_path any writable binary file object (e.g. io.BytesIO).
+    """
+    if backend not in _DOCX_BACKENDS:
+        raise ValueError(f"Unknown DOCX backend: {backend}")
+    if ruby_mode not in RUBY_MODES:
+        raise ValueError(f"Unknown ruby mode: {ruby_mode}")
+
+    with _open_source_lines(input_path) as source_lines:
+        lines = (line.rstrip("\r\n") for line in source_lines)
+        _DOCX_BACKENDS[backend](lines, output_path, ruby_mode)
+
 skipped_line_number = [None]  # mutable container to store the first skipped line number
 
 def ui_warning_callback(msg):
     if skipped_line_message[0] is None:
         skipped_line_message[0] = msg
 
+# Lines translated per step: looked ahead by the serial pipeline, and
+# saved to the translation memory together
+TRANSLATION_BATCH_SIZE = 32
+
+def translate_lines(lines: List[str], memo: Optional[dict] = None, batch_size: Optional[int] = None) -> dict:
+    """Translate the distinct non-blank lines with the offline translator.
+
+    Returns {line: translation}. Lines already in memo are not translated
+    again, so repeated chorus lines cost one translation per document. With
+    the translation memory enabled, lines from earlier runs are not
+    translated at all, and new ones are saved every batch_size lines
+    (default TRANSLATION_BATCH_SIZE). Each line is translated on its own,
+    so its translation doesn't depend on which lines it was batched with.
+    """
+    batch_size = batch_size or TRANSLATION_BATCH_SIZE
+    memo = {} if memo is None else memo
+    pending = [line for line in dict.fromkeys(lines) if line and line not in memo]
+    use_memory = bool(_translation_memory_path and translation_model_id and pending)
+    if use_memory:
+        memo.update(_translation_memory_get(pending))
+        pending = [line for line in pending if line not in memo]
+
+    if pending:
+        # Don't race the warm-up thread for the first model load
+        wait_for_translator_warm_up()
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        new_translations = {line: translator.translate(line) for line in batch}
+        memo.update(new_translations)
+        if use_memory:
+            _translation_memory_put(new_translations)
+    return memo
+
+# Lines held in memory at a time by the streaming JSON pipeline
+STREAM_CHUNK_SIZE = 256
+
+def _iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _count_lines(path: str) -> int:
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+# Translations kept across chunks (stream mode, each pool worker), so a
+# chorus repeated through a long file is still translated once
+CHUNK_TRANSLATION_MEMO_SIZE = 10_000
+
+def _trim_memo(memo: dict, size: int = CHUNK_TRANSLATION_MEMO_SIZE) -> None:
+    """Drop the oldest entries (dicts keep insertion order) beyond size."""
+    for key in list(islice(memo, max(0, len(memo) - size))):
+        del memo[key]
+
+def _iter_serial_results(clean_lines: List[str], use_offline: bool, translations: Optional[dict] = None):
+    """Yield (line, pairs, local translation) for each stripped line, in order."""
+    translations = {} if translations is None else translations
+    for i, (clean_line, pairs) in enumerate(zip(clean_lines, convert_lines_to_ruby_pairs(clean_lines))):
+        if i % TRANSLATION_BATCH_SIZE == 0 and use_offline and translator:
+            translate_lines(clean_lines[i:i + TRANSLATION_BATCH_SIZE], translations)
+        yield clean_line, pairs, translations.get(clean_line, "")
+
+def _iter_streamed_results(clean_lines: Iterable[str], use_offline: bool):
+    """Same as _iter_serial_results, but only STREAM_CHUNK_SIZE lines are held at once."""
+    translations = {}
+    for chunk in _iter_chunks(clean_lines, STREAM_CHUNK_SIZE):
+        yield from _iter_serial_results(chunk, use_offline, translations)
+        _trim_memo(translations)
+
+def _init_worker(ruby_cache_path, ruby_cache_max_entries, translation_memory_path):
+    # Each worker imports this module fresh (spawn), so it has its own kakasi.
+    # The translator is loaded on first use in _convert_chunk.
+    global _ruby_cache_path, _ruby_cache_max_entries, _translation_memory_path
+    _ruby_cache_path = ruby_cache_path
+    _ruby_cache_max_entries = ruby_cache_max_entries
+    _translation_memory_path = translation_memory_path
+
+_worker_translations = {}
+
+def _convert_chunk(clean_lines: List[str], use_offline: bool):
+    """Worker task: returns the chunk's results plus its translation memory hits/misses."""
+    if use_offline and any(clean_lines) and "translator" not in globals():
+        heavy_initialization()
+    hits, misses = translation_memory_stats["hits"], translation_memory_stats["misses"]
+    results = list(_iter_serial_results(clean_lines, use_offline, _worker_translations))
+    _trim_memo(_worker_translations)
+    return (
+        results,
+        translation_memory_stats["hits"] - hits,
+        translation_memory_stats["misses"] - misses,
+    )
+
+def _iter_worker_results(clean_lines: Iterable[str], use_offline: bool, workers: int, chunk_size: int):
+    """Same as _iter_serial_results, but chunks are converted in a process pool."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(_ruby_cache_path, _ruby_cache_max_entries, _translation_memory_path)
+    ) as pool:
+        # Futures are collected in submission order, so output order is
+        # preserved; at most two chunks per worker are in flight at a time.
+        in_flight = deque()
+        for chunk in _iter_chunks(clean_lines, chunk_size):
+            in_flight.append(pool.submit(_convert_chunk, chunk, use_offline))
+            if len(in_flight) >= workers * 2:
+                yield from _collect_chunk(in_flight.popleft())
+        while in_flight:
+            yield from _collect_chunk(in_flight.popleft())
+
+def _collect_chunk(future):
+    chunk_results, hits, misses = future.result()
+    translation_memory_stats["hits"] += hits
+    translation_memory_stats["misses"] += misses
+    return chunk_results
+
+def _write_json_array(f, entries: Iterable[dict]) -> None:
+    """Write entries as a JSON array, one at a time, formatted exactly like json.dump(indent=2)."""
+    first = True
+    for entry in entries:
+        f.write("[\n  " if first else ",\n  ")
+        # JSON strings never contain raw newlines, so this only re-indents structure
+        f.write(json.dumps(entry, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+        first = False
+    f.write("[]" if first else "\n]")
+
 def process_lines_with_options(
-    input_path: str,
-    output_path: str,
+    input_path: TextSource,
+    output_path,
     manual_xlsx: Optional[str] = None,
     use_offline: bool = True,
     use_online: bool = False,
     export_spreadsheet: bool = False,
     progress_callback=None,
-    ui_warning_callback=None
+    ui_warning_callback=None,
+    workers: int = 1,
+    chunk_size: Optional[int] = None,
+    stream: bool = False,
+    spreadsheet_path=None,
+    print_lines: bool = False
 ):
+    """Write the furigana JSON (and optionally .xlsx) for input_path.
+
+    input_path may also be the text itself (a str that isn't the path of
+    an existing file), an open text stream or an iterable of lines;
+    output_path may be a text or binary file object.
+    The spreadsheet goes next to output_path unless spreadsheet_path (a
+    path or binary file object) is given, which it must be when output_path
+    is a file object.
+
+    print_lines echoes every processed line to stdout (for debugging).
+
+    With workers > 1, furigana and offline translation run in a pool of
+    worker processes, chunk_size lines at a time. Output is identical to
+    the serial run and progress_callback is still called once per line.
+
+    With stream=True the input is read lazily and JSON entries are written
+    as they are produced, so memory stays flat however long the input is.
+    Only path inputs are read lazily; other sources are read up front.
+    """
+    if export_spreadsheet and spreadsheet_path is None:
+        if hasattr(output_path, "write"):
+            raise ValueError("spreadsheet_path is required when output_path is a file object")
+        spreadsheet_path = os.path.splitext(output_path)[0] + ".xlsx"
+
     manual_translations = load_manual_translation(manual_xlsx) if manual_xlsx else {}
-    with open(input_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
+    start_time = time.perf_counter()
+    if stream and _is_path_source(input_path):
+        total = _count_lines(input_path)
+        clean_lines = (line.strip() for line in _iter_source_lines(input_path))
+    else:
+        clean_lines = [line.strip() for line in _iter_source_lines(input_path)]
+        total = len(clean_lines)
+
+    if workers > 1:
+        if not chunk_size:
+            chunk_size = max(1, min(256, total // (workers * 4)))
+        results = _iter_worker_results(clean_lines, use_offline, workers, chunk_size)
+    elif stream:
+        results = _iter_streamed_results(clean_lines, use_offline)
+    else:
+        results = _iter_serial_results(clean_lines, use_offline)
 
     spreadsheet_data = []
-    output_data = []
-
-    total = len(lines)
-
-    for i, line in enumerate(lines):
-        clean_line = line.strip() 
 
-        if clean_line == "":
-            # This is a blank line
-            styled_jp = ""   # For spreadsheet and Word, keep blank
-            manual = ""
-            local = ""
-            online = ""
+    def iter_entries():
+        for i, (clean_line, pairs, local) in enumerate(results):
+            if clean_line == "":
+                # This is a blank line
+                styled_jp = ""   # For spreadsheet and Word, keep blank
+                manual = ""
+                local = ""
+                online = ""
 
-            # For JSON output, use paragraph break symbol instead of empty string
-            json_jp_text = "\n\n"
+                # For JSON output, use paragraph break symbol instead of empty string
+                json_jp_text = "\n\n"
 
-        else:
-            pairs = convert_line_to_ruby_pairs(clean_line)
-            styled_jp = "".join(
-                [f"<ruby={reading}>{base}</ruby>" if reading else base for base, reading in pairs]
-            )
-            manual = manual_translations.get(clean_line, "")
-            if manual_xlsx is not None and manual == "":
-                warning_msg = f"Manual translation skipped for line: '{clean_line[:30]}...'"
-                if ui_warning_callback:
-                    ui_warning_callback(f"Partial manual translation: Japanese doesn't match from Row {i + 2}")
-            local = translator.translate(clean_line) if translator and use_offline else ""
-            online = translate_online(clean_line) if use_online else ""
-            json_jp_text = styled_jp  # normal line styled for JSON
-
-        spreadsheet_data.append([clean_line, manual, local, online])
-        print(f"Line {i}: '{clean_line}' (empty? {clean_line == ''})")
-        entry = {"jp_text": json_jp_text}
-
-        if manual_xlsx is not None:
-            entry["manual"] = manual or ""
-
-        if use_offline:
-            entry["local"] = local or ""
-
-        if use_online:
-            entry["online"] = online or ""
-
-        output_data.append(entry)
-
-        if progress_callback:
-            progress_callback(i, total)
+            else:
+                styled_jp = "".join(
+                    [f"<ruby={reading}>{base}</ruby>" if reading else base for base, reading in pairs]
+                )
+                manual = manual_translations.get(clean_line, "")
+                if manual_xlsx is not None and manual == "":
+                    warning_msg = f"Manual translation skipped for line: '{clean_line[:30]}...'"
+                    if ui_warning_callback:
+                        ui_warning_callback(f"Partial manual translation: Japanese doesn't match from Row {i + 2}")
+                online = translate_online(clean_line) if use_online else ""
+                json_jp_text = styled_jp  # normal line styled for JSON
+
+            if export_spreadsheet:
+                spreadsheet_data.append([clean_line, manual, local, online])
+            if print_lines:
+                print(f"Line {i}: '{clean_line}' (empty? {clean_line == ''})")
+            entry = {"jp_text": json_jp_text}
+
+            if manual_xlsx is not None:
+                entry["manual"] = manual or ""
+
+            if use_offline:
+                entry["local"] = local or ""
+
+            if use_online:
+                entry["online"] = online or ""
+
+            yield entry
+
+            if progress_callback:
+                progress_callback(i, total)
+
+    if stream:
+        with _open_text_sink(output_path) as f:
+            _write_json_array(f, iter_entries())
+    else:
+        output_data = list(iter_entries())
+        with _open_text_sink(output_path) as f:
+            json.dump(output_data, f, ensure_ascii=False, indent=2)
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        import json
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
+    elapsed = time.perf_counter() - start_time
+    logging.info(f"Processed {total} lines in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.1f} lines/sec)")
+    if _translation_memory_path and use_offline:
+        logging.info(f"Translation memory hit rate: {translation_memory_hit_rate():.1%}")
 
     if export_spreadsheet:
-        xlsx_path = os.path.splitext(output_path)[0] + ".xlsx"
         save_spreadsheet(
-            xlsx_path,
+            spreadsheet_path,
             spreadsheet_data,
             include_manual=bool(manual_xlsx),
             include_local=use_offline,
             include_online=use_online
         )
 
-def load_manual_translation(path: str) -> dict:
-    wb = openpyxl.load_workbook(path)
-    sheet = wb.active
-    data = {}
-    for row in sheet.iter_rows(min_row=2):
-        jp = row[0].value
-        manual = row[1].value
-        if jp and manual:
-            data[jp.strip()] = manual.strip()
+# Parsed manual translations are kept in a JSON sidecar next to the
+# workbook ("<workbook>.index.json"), valid while the workbook's path,
+# size and mtime are unchanged.
+MANUAL_INDEX_SUFFIX = ".index.json"
+_MANUAL_INDEX_VERSION = 1
+
+def _manual_index_key(path: str) -> dict:
+    st = os.stat(path)
+    return {
+        "version": _MANUAL_INDEX_VERSION,
+        "path": os.path.abspath(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+def _read_manual_index(path: str, key: dict) -> Optional[dict]:
+    try:
+        with open(path + MANUAL_INDEX_SUFFIX, encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("key") != key:
+        return None
+    return index.get("translations")
+
+def _write_manual_index(path: str, key: dict, translations: dict) -> None:
+    index_path = path + MANUAL_INDEX_SUFFIX
+    tmp_path = index_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "translations": translations}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        logging.warning(f"Could not write manual translation index {index_path}: {e}")
+
+def load_manual_translation(path: str, use_index: bool = True) -> dict:
+    """Japanese line -> manual translation from the first two columns of path.
+
+    With use_index, the parsed mapping is reused from the sidecar index
+    while the workbook is unchanged, and re-parsed (and the index
+    rewritten) when it changes.
+    """
+    if not use_index:
+        return _parse_manual_translation(path)
+
+    key = _manual_index_key(path)
+    data = _read_manual_index(path, key)
+    if data is None:
+        data = _parse_manual_translation(path)
+        _write_manual_index(path, key, data)
     return data
 
+def _parse_manual_translation(path: str) -> dict:
+    import openpyxl
+    # Read-only mode streams rows from the sheet XML instead of building
+    # every cell object; only the first two columns are read.
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = wb.active
+        data = {}
+        for jp, manual in sheet.iter_rows(min_row=2, max_col=2, values_only=True):
+            if jp and manual:
+                data[jp.strip()] = manual.strip()
+        return data
+    finally:
+        wb.close()
+
 def save_spreadsheet(output_path: str, rows: List[List[str]], include_manual=True, include_local=True, include_online=True):
-    wb = openpyxl.Workbook()
-    ws = wb.active
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    # Write-only mode streams rows to disk as they are appended
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
     
     headers = ["Japanese"]
     if include_manual:
@@ -479,9 +1416,13 @@ def save_spreadsheet(output_path: str, rows: List[List[str]], include_manual=Tru
     if include_online:
         headers.append("Online Translation")
 
-    ws.append(headers)
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
+    bold = Font(bold=True)
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = bold
+        header_cells.append(cell)
+    ws.append(header_cells)
     
     for row in rows:
         filtered_row = [row[0]]
@@ -496,6 +1437,7 @@ def save_spreadsheet(output_path: str, rows: List[List[str]], include_manual=Tru
     wb.save(output_path)
 
 def translate_online(text: str) -> str:
+    import requests
     try:
         url = "https://libretranslate.de/translate"
         payload = {
@@ -0,0 +1,88 @@
+"""Check how long the two GUI apps take to import, without starting Tk.
+
+    python shared/check_import_time.py [runs]
+
+Each app module is imported in a fresh interpreter under a name other
+than __main__ (so no window opens), runs times, with -X importtime. The
+median wall-clock import time and the slowest imports it pulls in are
+printed. Exits with status 1 when an app is over its time budget or
+loads at startup a module it should only import on first use.
+"""
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# Imported inside the JMRParser functions that need them; loading any of
+# these at startup is the regression this script is for
+DEFERRED_MODULES = ("argostranslate", "ctranslate2", "pykakasi", "openpyxl", "docx", "multiprocessing")
+
+# app -> (module file, extra sys.path entries, budget in ms, modules it must not load)
+APPS = (
+    ("Furigana Parser", REPO_ROOT / "furiganaparser" / "Furigana Parser.py", [REPO_ROOT / "shared"], 250,
+     DEFERRED_MODULES + ("requests", "urllib.request")),
+    # The scraper needs requests (and with it urllib.request) up front
+    ("JPlyricScraper", REPO_ROOT / "lyricsretriever" / "JPlyricScraper.py", [], 600,
+     DEFERRED_MODULES),
+)
+
+# Written to stderr right before the app is imported; -X importtime lines
+# before it belong to interpreter startup
+APP_MARKER = "-- app import --"
+
+IMPORT_APP = """
+import importlib.util, sys, time
+sys.path[:0] = {paths!r}
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("app_under_test", {path!r})
+sys.stderr.write("{marker}\\n"); sys.stderr.flush()
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print((time.perf_counter() - started) * 1000)
+print(" ".join(name for name in {deferred!r} if name in sys.modules))
+"""
+
+def import_once(path, paths, deferred):
+    """Return (wall ms, deferred modules loaded, {module: cumulative us}) for one cold import."""
+    code = IMPORT_APP.format(path=str(path), paths=[str(p) for p in paths],
+                              deferred=deferred, marker=APP_MARKER)
+    # JMRParser opens its log next to sys.argv[0], i.e. in the cwd for -c
+    with tempfile.TemporaryDirectory() as cwd:
+        res = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             capture_output=True, text=True, encoding="utf-8", cwd=cwd)
+    if res.returncode != 0:
+        raise RuntimeError(f"importing {path.name} failed:\n{res.stderr[-2000:]}")
+    wall_ms, loaded = (res.stdout.splitlines() + [""])[:2]
+
+    # "import time: self [us] | cumulative | <indent>name"; keep the
+    # app's direct imports (the least indented lines)
+    rows = []
+    for line in res.stderr.split(APP_MARKER, 1)[-1].splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative)))
+    top_level = min((depth for depth, _, _ in rows), default=0)
+    modules = {name: us for depth, name, us in rows if depth == top_level}
+    return float(wall_ms), loaded.split(), modules
+
+def main(runs=5):
+    failed = 0
+    for label, path, paths, budget_ms, deferred in APPS:
+        samples = [import_once(path, paths, deferred) for _ in range(runs)]
+        wall_ms = statistics.median(ms for ms, _, _ in samples)
+        loaded = sorted({name for _, names, _ in samples for name in names})
+        _, _, modules = samples[-1]
+        ok = wall_ms <= budget_ms and not loaded
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label:16} {wall_ms:7.1f} ms (median of {runs}, budget {budget_ms} ms)")
+        for name, us in sorted(modules.items(), key=lambda item: -item[1])[:5]:
+            print(f"       {us / 1000:7.1f} ms  {name}")
+        if loaded:
+            print(f"       loaded at startup: {', '.join(loaded)}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))